@@ -0,0 +1,279 @@
+import sys
+import os
+import json
+import time
+import tempfile
+import argparse
+import platform
+import tracemalloc
+import numpy as np
+from PIL import Image as pilImage, ImageDraw
+from processors import *
+
+def time_call(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def benchmark_labeling(processor, img_paths):
+    print(" * Comparing cluster labeling engines...")
+    processor.holes = "overlay" # scan engine only draws holes as overlays
+
+    for path in img_paths:
+        img = processor.process_numpy_img(load_np_image(path))
+
+        processor.labeling = "scan"
+        scan_clusters, scan_time = time_call(processor.find_clusters, img)
+        processor.labeling = "array"
+        array_clusters, array_time = time_call(processor.find_clusters, img)
+
+        matches = len(scan_clusters) == len(array_clusters) and all([scan_contour.color == array_contour.color and np.array_equal(scan_contour.points, array_contour.points) for scan_contour, array_contour in zip(scan_clusters, array_clusters)])
+        print("   "+path+": scan "+("%.3f" % scan_time)+"s, array "+("%.3f" % array_time)+"s, speedup "+("%.1f" % (scan_time / max(array_time, 1e-9)))+"x, "+str(len(array_clusters))+" clusters, "+("outputs match" if matches else "OUTPUTS DIFFER"))
+
+def make_stroke_img(size=400, num_strokes=3, stroke_width=3):
+    # long, thin pen strokes: spirals drawn in black on white, already in processed (contrasted) format
+    img = pilImage.new("L", (size, size), 255)
+    draw = ImageDraw.Draw(img)
+    for i in range(num_strokes):
+        center = (size * (i+1) / (num_strokes+1), size * 0.5)
+        angles = np.linspace(0.0, 6.0 * np.pi, 600)
+        radii = angles / (6.0 * np.pi) * size / (2.0 * (num_strokes+1))
+        points = list(zip(center[0] + radii * np.cos(angles), center[1] + radii * np.sin(angles)))
+        draw.line(points, fill=0, width=stroke_width)
+
+    np_img = (np.array(img) >= 128).astype(float)
+    return np.tile(np.expand_dims(np_img, axis=0), [3, 1, 1])
+
+def count_invalid_contours(contours, img): # counts contours passing their seed more than once, or with more points than their outer boundary has pixels
+    # assumes contours decimated by min_dist_threshold, full resolution traces revisit pixels of 1 pixel wide parts
+    structure = np.ones((3, 3), dtype=bool)
+    dark_img = img[0] < 0.5
+    all_labels = {False: scipy.ndimage.label(dark_img, structure=structure)[0], True: scipy.ndimage.label(np.logical_not(dark_img), structure=structure)[0]}
+
+    num_invalid = 0
+    for contour in contours:
+        for traced in [contour] + contour.holes:
+            points = traced.points
+            if len(points) < 2:
+                continue
+
+            # outer boundary is every pixel of component (holes filled in) with a background pixel 4-adjacent to it
+            labels = all_labels[traced.color == "white"]
+            mask = scipy.ndimage.binary_fill_holes(labels == labels[points[0][0], points[0][1]])
+            num_boundary_pixels = np.sum(mask & np.logical_not(scipy.ndimage.binary_erosion(mask)))
+
+            passes_seed_once = not np.any(np.all(points[1:-1] == points[0], axis=1))
+            if not passes_seed_once or len(points)-1 > num_boundary_pixels:
+                num_invalid += 1
+
+    return num_invalid
+
+def benchmark_tracers(processor, imgs):
+    print(" * Comparing cluster tracers...")
+
+    for name, img in imgs:
+        results = []
+        for tracer in ["heads", "border"]:
+            processor.tracer = tracer
+            clusters, trace_time = time_call(processor.find_clusters, img)
+            results.append((tracer, trace_time, sum([len(contour) + sum([len(hole) for hole in contour.holes]) for contour in clusters]), count_invalid_contours(clusters, img)))
+
+        print("   "+name+": "+", ".join([tracer+" "+("%.3f" % trace_time)+"s ("+str(num_points)+" points, "+(str(num_invalid)+" INVALID CONTOURS" if num_invalid > 0 else "contours valid")+")" for tracer, trace_time, num_points, num_invalid in results]))
+
+def benchmark_resize(processor, imgs):
+    print(" * Comparing resize backends...")
+
+    for name, src_img in imgs:
+        results = {}
+        for resize in ["skimage", "area"]:
+            processor.resize = resize
+            ratio = processor.get_rescale_ratio(src_img.shape[1:])
+            gray_img, resize_time = time_call(processor.rescale_img, src_img, ratio)
+            img, process_time = time_call(processor.process_numpy_img, src_img)
+            results[resize] = (np.mean(gray_img, axis=0), img[0] < 0.5, resize_time, process_time)
+
+        # quality as difference of area backend from current skimage backend, in gray levels & thresholded pixels
+        skimage_gray, skimage_dark, skimage_resize_time, skimage_process_time = results["skimage"]
+        area_gray, area_dark, area_resize_time, area_process_time = results["area"]
+        gray_error = np.mean(np.abs(area_gray - skimage_gray))
+        dark_error = np.mean(area_dark != skimage_dark)
+        print("   "+name+": resize skimage "+("%.3f" % skimage_resize_time)+"s, area "+("%.3f" % area_resize_time)+"s ("+("%.1f" % (skimage_resize_time / max(area_resize_time, 1e-9)))+"x), "+
+            "preprocess "+("%.3f" % skimage_process_time)+"s -> "+("%.3f" % area_process_time)+"s, mean gray diff "+("%.4f" % gray_error)+", "+("%.3f" % (dark_error * 100.0))+"% pixels differ")
+
+DRAWING_KINDS = ["strokes", "blobs", "rings", "glyphs", "speckle"]
+
+def make_synthetic_drawing(kind, size, seed=0):
+    # reproducible drawing of given kind, returned as raw (3, size, size) img in the format of load_np_image
+    rng = np.random.RandomState(seed)
+    img = pilImage.new("L", (size, size), 255)
+    draw = ImageDraw.Draw(img)
+    scale = size / 500.0 # feature counts grow with area, keeping feature sizes & ink density fixed
+
+    if kind == "strokes": # long wandering pen strokes of varying width
+        for i in range(int(40 * scale * scale)):
+            num_points = rng.randint(20, 80)
+            steps = rng.normal(0.0, 6.0, size=(num_points, 2)).cumsum(axis=0)
+            points = rng.uniform(0, size, size=2) + steps
+            draw.line([tuple(point) for point in points], fill=0, width=int(rng.uniform(2, 6)))
+    elif kind == "blobs": # filled irregular polygons
+        for i in range(int(25 * scale * scale)):
+            center = rng.uniform(0, size, size=2)
+            angles = np.sort(rng.uniform(0.0, 2.0 * np.pi, size=rng.randint(5, 12)))
+            radii = rng.uniform(5.0, 25.0, size=len(angles))
+            draw.polygon([(center[0] + r * np.cos(a), center[1] + r * np.sin(a)) for r, a in zip(radii, angles)], fill=0)
+    elif kind == "rings": # nested concentric rings, each leaving a hole inside the one around it
+        for i in range(int(10 * scale * scale)):
+            center = rng.uniform(0, size, size=2)
+            radius = rng.uniform(15.0, 45.0)
+            while radius > 3.0:
+                width = int(rng.uniform(1.5, 4.0))
+                draw.ellipse([center[0] - radius, center[1] - radius, center[0] + radius, center[1] + radius], outline=0, width=width)
+                radius -= width + rng.uniform(3.0, 8.0)
+    elif kind == "glyphs": # lines of small letter-like clusters of short strokes, as in handwritten text
+        glyph_size = 10.0
+        for line_y in np.arange(glyph_size * 2, size - glyph_size, glyph_size * 2.5):
+            line_x = rng.uniform(0, glyph_size * 3)
+            while line_x < size - glyph_size:
+                for stroke in range(rng.randint(1, 4)):
+                    start = (line_x + rng.uniform(0, glyph_size), line_y + rng.uniform(0, glyph_size))
+                    end = (line_x + rng.uniform(0, glyph_size), line_y + rng.uniform(0, glyph_size))
+                    draw.line([start, end], fill=0, width=2)
+                line_x += glyph_size * rng.uniform(0.9, 1.4) + (glyph_size * 1.5 if rng.rand() < 0.2 else 0.0)
+    elif kind == "speckle": # isolated dust specks & scanner noise
+        for i in range(int(1500 * scale * scale)):
+            x, y = rng.uniform(0, size, size=2)
+            radius = rng.uniform(0.5, 2.5)
+            draw.ellipse([x - radius, y - radius, x + radius, y + radius], fill=0)
+    else:
+        raise ValueError("unknown drawing kind: "+kind)
+
+    np_img = np.array(img).astype(float) / 256.0
+    return np.tile(np.expand_dims(np_img, axis=0), [3, 1, 1])
+
+def run_synthetic_case(processor, kind, size, output_dir, repeat=1, measure_memory=True):
+    # vectorizes drawing at its own resolution, returning best-of-repeat timings & per-stage times of that run
+    src_img = make_synthetic_drawing(kind, size)
+    processor.target_size = size
+    output_path = os.path.join(output_dir, kind+"_"+str(size)+".svg")
+
+    best = None
+    for i in range(repeat):
+        processor.profiler.reset()
+        start = time.perf_counter()
+        img = processor.process_numpy_img(src_img)
+        stats = processor.vectorize_to_path(img, output_path)
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best["seconds"]:
+            best = {"seconds": seconds, "stats": stats, "stages": {name: stage["seconds"] for name, stage in processor.profiler.get_report()["stages"].items()}}
+        del img
+
+    # peak memory is measured in a separate, untimed run, since tracing allocations skews timings
+    peak_bytes = None
+    if measure_memory:
+        tracemalloc.start()
+        img = processor.process_numpy_img(src_img)
+        processor.vectorize_to_path(img, output_path)
+        del img
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        "kind": kind,
+        "size": size,
+        "seconds": best["seconds"],
+        "images_per_second": 1.0 / max(best["seconds"], 1e-9),
+        "stages": best["stages"],
+        "peak_bytes": peak_bytes,
+        "output_bytes": best["stats"]["bytes"],
+        "paths": best["stats"]["paths"],
+        "commands": best["stats"]["commands"],
+    }
+
+def benchmark_synthetic(processor, kinds, sizes, repeat=1, measure_memory=True):
+    print(" * Benchmarking synthetic drawings...")
+
+    results = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        run_synthetic_case(processor, "strokes", 100, output_dir, measure_memory=False) # warms up lazy imports & caches
+        for size in sizes:
+            for kind in kinds:
+                result = run_synthetic_case(processor, kind, size, output_dir, repeat=repeat, measure_memory=measure_memory)
+                results.append(result)
+                slowest_stages = sorted(result["stages"].items(), key=lambda stage: -stage[1])[:3]
+                print("   "+kind+"_"+str(size)+": "+("%.3f" % result["seconds"])+"s ("+("%.2f" % result["images_per_second"])+" img/s), "+
+                    (("%.1f" % (result["peak_bytes"] / float(1<<20)))+" MB peak, " if result["peak_bytes"] is not None else "")+
+                    str(result["output_bytes"])+" bytes out; "+", ".join([name+" "+("%.3f" % seconds)+"s" for name, seconds in slowest_stages]))
+    return results
+
+def get_case_name(result):
+    return result["kind"]+"_"+str(result["size"])
+
+def compare_results(results, baseline, tolerance=0.1): # returns names of cases slower than baseline by more than tolerance
+    print(" * Comparing against baseline...")
+
+    baseline_results = dict([(get_case_name(result), result) for result in baseline["results"]])
+    regressions = []
+    for result in results:
+        name = get_case_name(result)
+        if name not in baseline_results:
+            print("   "+name+": not in baseline")
+            continue
+
+        baseline_result = baseline_results[name]
+        ratio = result["seconds"] / max(baseline_result["seconds"], 1e-9)
+        line = "   "+name+": "+("%.3f" % baseline_result["seconds"])+"s -> "+("%.3f" % result["seconds"])+"s ("+("%+.1f" % ((ratio - 1.0) * 100.0))+"%)"
+        if result["output_bytes"] != baseline_result["output_bytes"]:
+            line += ", output "+str(baseline_result["output_bytes"])+" -> "+str(result["output_bytes"])+" bytes"
+        if ratio > 1.0 + tolerance:
+            regressions.append(name)
+            line += "  REGRESSION"
+        print(line)
+
+    print("   "+str(len(regressions))+" regression(s) beyond "+("%.0f" % (tolerance * 100.0))+"%")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="*", help="images to compare labeling engines (--engines) & resize backends (--compare-resize) on")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 1000, 2000, 4000, 8000], help="side lengths of synthetic drawings, in pixels")
+    parser.add_argument("--kinds", nargs="+", default=DRAWING_KINDS, choices=DRAWING_KINDS, help="kinds of synthetic drawings")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per drawing, keeping the fastest")
+    parser.add_argument("--no-memory", action="store_true", help="skip the extra run measuring peak memory")
+    parser.add_argument("--compact", action="store_true", help="benchmark the compact (low memory) preprocessing path")
+    parser.add_argument("--tracer", default="heads", choices=["heads", "border"], help="contour tracer to benchmark")
+    parser.add_argument("--save", default=None, help="write results to this json file")
+    parser.add_argument("--compare", default=None, help="json file of earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="slowdown relative to baseline reported as a regression")
+    parser.add_argument("--engines", action="store_true", help="also compare labeling engines & tracers")
+    parser.add_argument("--resize", default="skimage", choices=["skimage", "area"], help="resize backend to benchmark")
+    parser.add_argument("--compare-resize", action="store_true", help="also compare speed & quality of resize backends")
+    args = parser.parse_args()
+
+    if args.engines:
+        processor = PictureVectorizer(threshold=0.835, coeff=10.0, target_size=1200, stroke_width=0.5, color='#000', min_dist_threshold=3.2, close_trace_threshold=2.1)
+        benchmark_labeling(processor, args.paths)
+        benchmark_tracers(processor, [("strokes_"+str(size), make_stroke_img(size=size)) for size in [400, 800, 1600]])
+
+    if args.compare_resize:
+        processor = PictureVectorizer(threshold=0.835, coeff=10.0, target_size=1200, stroke_width=0.5, color='#000', min_dist_threshold=3.2, close_trace_threshold=2.1)
+        benchmark_resize(processor, [(path, load_np_image(path)) for path in args.paths] + [(kind+"_"+str(size), make_synthetic_drawing(kind, size)) for size in [2000, 4000] for kind in DRAWING_KINDS])
+
+    processor = PictureVectorizer(threshold=0.835, coeff=10.0, target_size=1200, stroke_width=0.5, color='#000', min_dist_threshold=3.2, close_trace_threshold=2.1, compact=args.compact, tracer=args.tracer, resize=args.resize, profile=True)
+    results = benchmark_synthetic(processor, args.kinds, args.sizes, repeat=args.repeat, measure_memory=not args.no_memory)
+    run = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "params": processor.get_params(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+
+    if args.save is not None:
+        write_json(run, args.save)
+        print(" * Saved results to "+args.save)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            regressions = compare_results(results, json.load(f), tolerance=args.tolerance)
+        if len(regressions) > 0:
+            sys.exit(1)
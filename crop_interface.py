@@ -1,45 +1,50 @@
 
 import sys
 import os
+import threading
 from PIL import Image as pilImage
 
 from kivy.app import App
-from kivy.core.window import Window
 from kivy.uix.widget import Widget
-from kivy.clock import Clock
+from kivy.clock import Clock, mainthread
 
 from util_interface import *
 from util import *
+from processors import PictureVectorizer, PreviewRenderer
 
 
 
 
 class BaseWidget(Widget):
 
-    def __init__(self, img_size, img_path):
+    def __init__(self, img_size, img_path, texture_path=None, preview=False):
         super(BaseWidget, self).__init__()
 
         self.img_path = img_path
 
-        Clock.schedule_interval(self.on_update, 0)
+        animation_scheduler.register(self.on_update)
 
         self.t = 0.0
         self.objects = []
         self.interactables = []
         self.rotation_state = False # True = 180 degree rotation
 
-        self.main_img = CRect(pos=(img_size[0]/2.0, img_size[1]/2.0), size=img_size, texture_path=img_path)
+        # crop bounds are normalized to displayed size, so a downsampled texture maps back exactly to original pixels
+        self.main_img = CRect(pos=(img_size[0]/2.0, img_size[1]/2.0), size=img_size, texture_path=texture_path if texture_path is not None else img_path)
         self.objects.append(self.main_img)
 
-        self.button_rotate = Button(((img_size[0]/2.0), img_size[1]+60.0), text="Rotate Image", stateful=False, width=315.0, callback=self.rotate_image)
-        self.interactables.append(self.button_rotate)
-
-        self.button_enable_resizing = Button(((img_size[0]/2.0)-336.0, img_size[1]+60.0), text="Enable Auto-Rescaling", stateful=True, width=315.0)
+        self.button_enable_resizing = Button(((img_size[0]/2.0)-378.0, img_size[1]+60.0), text="Enable Auto-Rescaling", stateful=True, width=240.0)
         self.interactables.append(self.button_enable_resizing)
 
-        self.button_batch_transform = Button(((img_size[0]/2.0)+336.0, img_size[1]+60.0), text="Batch Transform", stateful=False, width=315.0, callback=self.batch_transform)
+        self.button_rotate = Button(((img_size[0]/2.0)-126.0, img_size[1]+60.0), text="Rotate Image", stateful=False, width=240.0, callback=self.rotate_image)
+        self.interactables.append(self.button_rotate)
+
+        self.button_batch_transform = Button(((img_size[0]/2.0)+126.0, img_size[1]+60.0), text="Batch Transform", stateful=False, width=240.0, callback=self.batch_transform)
         self.interactables.append(self.button_batch_transform)
 
+        self.button_batch_vectorize = Button(((img_size[0]/2.0)+378.0, img_size[1]+60.0), text="Crop & Vectorize", stateful=False, width=240.0, callback=self.batch_vectorize)
+        self.interactables.append(self.button_batch_vectorize)
+
         self.crop_corner_a = ImageButton(((img_size[0]/2.0)-100.0, (img_size[1]/2.0)+100.0), (140, 140), "graphics/template_guide_a.png", draggable=True, drag_callback=self.corner_a_drag)
         self.interactables.append(self.crop_corner_a)
 
@@ -57,6 +62,17 @@ class BaseWidget(Widget):
         for obj in self.interactables:
             self.canvas.add(obj)
 
+        # live preview vectorizes crop at low resolution in background, overlaid on img
+        self.preview_renderer = None
+        self.preview_event = None
+        self.batch_thread = None
+        self.preview_request = None
+        self.preview_overlay = None
+        if preview:
+            preview_processor = PictureVectorizer(threshold=0.835, coeff=10.0, target_size=400, stroke_width=0.5, color='#000', min_dist_threshold=3.2, close_trace_threshold=2.1, tracer="border", resize="area")
+            self.preview_renderer = PreviewRenderer(img_path, preview_processor, self.on_preview_rendered)
+            self.schedule_preview()
+
     # callbacks
 
     def rotate_image(self):
@@ -67,6 +83,8 @@ class BaseWidget(Widget):
         else:
             self.main_img.angle = 0.0
 
+        self.schedule_preview()
+
     def batch_transform(self):
         auto_rescaling_enabled = self.button_enable_resizing.state == 2
         rotation_state = self.rotation_state
@@ -75,7 +93,7 @@ class BaseWidget(Widget):
         output_path = batch_path+"_cropped"
         prepare_path(output_path)
 
-        x_min, x_max, y_min, y_max = self.calculate_crop_bounds_normalized()
+        crop_bounds = self.calculate_crop_bounds_normalized()
 
         print(" ** Starting batch transform...")
         for path in os.listdir(batch_path):
@@ -98,36 +116,98 @@ class BaseWidget(Widget):
                         img = np.stack(img_channels, axis=-1)
 
                 # performs actual cropping
-                x_min_ind = min(int((x_min*img.shape[1])+0.5), img.shape[1]-1)
-                x_max_ind = min(max(int((x_max*img.shape[1])+0.5), x_min_ind+1), img.shape[1]-1)
-                y_min_ind = min(int((y_min*img.shape[0])+0.5), img.shape[0]-1)
-                y_max_ind = min(max(int((y_max*img.shape[0])+0.5), y_min_ind+1), img.shape[0]-1)
-                img = img[img.shape[0]-1-y_max_ind: img.shape[0]-1-y_min_ind, x_min_ind: x_max_ind, :]
+                rows, cols = get_crop_slices(img.shape[:2], crop_bounds)
+                img = img[rows, cols, :]
 
                 pilImg = pilImage.fromarray(img.astype(np.uint8))
                 pilImg.save(os.path.join(output_path, path))
 
         print(" ** Batch transform complete")
 
+    def batch_vectorize(self):
+        # runs off ui thread so interface stays responsive, one batch at a time
+        if self.batch_thread is not None and self.batch_thread.is_alive():
+            print(" ** Batch crop & vectorize already running")
+            return
+
+        # crops each photo before any resampling and vectorizes it directly, without writing intermediate pngs
+        batch_path = "/".join(self.img_path.split("/")[:-1])
+        output_path = batch_path+"_vectorized"
+
+        processor = PictureVectorizer(threshold=0.835, coeff=10.0, target_size=1200, stroke_width=0.5, color='#000', min_dist_threshold=3.2, close_trace_threshold=2.1, draft_decode=True, crop_bounds=self.calculate_crop_bounds_normalized(), rotate=self.rotation_state)
+
+        self.batch_thread = threading.Thread(target=self.run_batch_vectorize, args=(processor, batch_path, output_path))
+        self.batch_thread.start()
+
+    def run_batch_vectorize(self, processor, batch_path, output_path):
+        print(" ** Starting batch crop & vectorize...")
+        try:
+            processor.process_batch(batch_path, output_path=output_path, workers=os.cpu_count() or 1, mp_context=get_threaded_mp_context())
+            print(" ** Batch crop & vectorize complete")
+        except Exception as e:
+            print(" ** Batch crop & vectorize failed - "+type(e).__name__+": "+str(e))
+
     def corner_a_drag(self):
         current_corner_pos = self.crop_corner_a.pos
         self.crop_corner_d.set_pos((self.crop_corner_d.pos[0], current_corner_pos[1]))
         self.crop_corner_b.set_pos((current_corner_pos[0], self.crop_corner_b.pos[1]))
+        self.schedule_preview()
 
     def corner_b_drag(self):
         current_corner_pos = self.crop_corner_b.pos
         self.crop_corner_c.set_pos((self.crop_corner_c.pos[0], current_corner_pos[1]))
         self.crop_corner_a.set_pos((current_corner_pos[0], self.crop_corner_a.pos[1]))
+        self.schedule_preview()
 
     def corner_c_drag(self):
         current_corner_pos = self.crop_corner_c.pos
         self.crop_corner_b.set_pos((self.crop_corner_b.pos[0], current_corner_pos[1]))
         self.crop_corner_d.set_pos((current_corner_pos[0], self.crop_corner_d.pos[1]))
+        self.schedule_preview()
 
     def corner_d_drag(self):
         current_corner_pos = self.crop_corner_d.pos
         self.crop_corner_a.set_pos((self.crop_corner_a.pos[0], current_corner_pos[1]))
         self.crop_corner_c.set_pos((current_corner_pos[0], self.crop_corner_c.pos[1]))
+        self.schedule_preview()
+
+    def schedule_preview(self):
+        # debounces preview requests while corners are dragged
+        if self.preview_renderer is None:
+            return
+        if self.preview_event is not None:
+            self.preview_event.cancel()
+        self.preview_event = Clock.schedule_once(self.request_preview, 0.15)
+
+    def request_preview(self, dt):
+        self.preview_event = None
+        preview_request = (self.calculate_crop_bounds_normalized(), self.rotation_state)
+        if preview_request != self.preview_request:
+            self.preview_request = preview_request
+            self.preview_renderer.submit(*preview_request)
+
+    @mainthread
+    def on_preview_rendered(self, crop_bounds, rotate, contours, img_shape):
+        if (crop_bounds, rotate) != self.preview_request:
+            return # crop changed since render started
+
+        if self.preview_overlay is not None:
+            self.canvas.remove(self.preview_overlay)
+        self.preview_overlay = InstructionGroup()
+
+        # preview img is rescaled crop padded by 2 pixels (1 lost to dilation), contours are mapped back onto displayed crop region
+        x_min, x_max, y_min, y_max = crop_bounds
+        scale_x = (x_max - x_min) * self.main_img.size[0] / max(img_shape[1] - 3, 1)
+        scale_y = (y_max - y_min) * self.main_img.size[1] / max(img_shape[0] - 3, 1)
+        for contour in contours:
+            if len(contour) < 3:
+                continue
+            points = np.stack(((x_min * self.main_img.size[0]) + ((contour.points[:, 1] - 2) * scale_x), (y_max * self.main_img.size[1]) - ((contour.points[:, 0] - 2) * scale_y)), axis=1).tolist()
+            points.append(points[0])
+            self.preview_overlay.add(CLine(points, color=(0.2, 0.6, 1.0), line_width=1.2))
+
+        # drawn over img but under buttons & crop corners
+        self.canvas.insert(1, self.preview_overlay)
 
     # user input/interaction
 
@@ -166,32 +246,45 @@ class BaseWidget(Widget):
             if hasattr(obj.__class__, 'on_click_up'):
                 obj.on_click_up(touch.pos)
 
-    def on_update(self, dt):
+    def on_update(self, dt): # returns True while any object is still animating
         self.t += dt
-        
+
+        animating = False
         for obj in self.objects:
-            obj.on_update(dt)
+            animating = obj.on_update(dt) or animating
 
         for obj in self.interactables:
-            obj.on_update(dt)
+            animating = obj.on_update(dt) or animating
+
+        return animating
 
 
 if __name__ == "__main__":
 
-    ## determines size of specified photo
+    ## optionally shows live vectorization preview of crop, e.g. "python crop_interface.py photos/a.jpg --preview"
+
+    preview = "--preview" in sys.argv[2:]
+
+    ## determines size of specified photo from its header, displaying at half size (at most 1400px)
 
     img_path = sys.argv[1].strip("/")
-    img = np.array(pilImage.open(img_path))
-    img_shape = (img.shape[1]/2.0, img.shape[0]/2.0)
+    img_size = probe_image_size(img_path)
+    display_scale = min(0.5, 1400.0 / max(img_size))
+    img_shape = (img_size[0]*display_scale, img_size[1]*display_scale)
+
+    ## texture is a cached, downsampled proxy no larger than needed for display
+
+    texture_path = get_proxy_image_path(img_path, img_shape)
 
-    ## launches interface with correct size for specified photo
+    ## launches interface with correct size for specified photo, window is only imported (which opens it) here, as batch worker processes re-import this module
 
+    from kivy.core.window import Window
     Window.size = (img_shape[0], img_shape[1] + 120.0)
 
     class MainApp(App):
         def build(self):
             self.title = 'Cropping Interface'
-            return BaseWidget(img_shape, img_path)
+            return BaseWidget(img_shape, img_path, texture_path=texture_path, preview=preview)
 
     app = MainApp()
     app.run()
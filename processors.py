@@ -1,11 +1,59 @@
 import numpy as np
+import io
+import copy
+import queue
+import hashlib
+import threading
+import collections
+import concurrent.futures
 import shutil
 import random
-import scipy
+import tempfile
+import time
+import scipy.ndimage
 from util import *
 
+class ClusterComponent(object):
+    def __init__(self, label, seed, bbox, area, is_white=False, parent=None):
+        self.label = label # label value in the dark or white label array
+        self.seed = seed # first pixel of component in raster order, starting point for tracing
+        self.bbox = bbox # (x_min, x_max, y_min, y_max), max bounds exclusive
+        self.area = area
+        self.is_white = is_white
+        self.parent = parent # for white components, label of dark component enclosing them
+
+class Contour(object):
+    # traced outline of a component, passed through every stage from tracing to svg writing without copying its points
+    __slots__ = ("points", "color", "bbox", "area", "holes", "parent", "curves")
+
+    def __init__(self, points, color, bbox=None, area=0, holes=None, parent=None, curves=None):
+        self.points = points # (N, 2) int32 array of (row, col) img coords
+        self.curves = curves # (N, 4, 2) float64 array of bezier control points fitted to points, None unless fitted
+        self.color = color
+        self.bbox = bbox # (x_min, x_max, y_min, y_max) of traced component, max bounds exclusive
+        self.area = area # pixels in traced component
+        self.holes = []
+        self.parent = parent # contour enclosing this one, if it is a hole
+        self.set_holes(holes or [])
+
+    def __len__(self):
+        return len(self.points)
+
+    def set_holes(self, holes): # links hole contours to this one as their parent
+        self.holes = holes
+        for hole in holes:
+            hole.parent = self
+
+    def with_points(self, points, holes=None): # returns contour of same component with replaced points, e.g. once simplified
+        return Contour(points, self.color, bbox=self.bbox, area=self.area, holes=holes)
+
+    def with_curves(self, curves, holes=None): # returns contour of same component & points with fitted curves, or with no points if none could be fitted
+        if len(curves) == 0:
+            return self.with_points(np.zeros((0, 2), dtype=np.int32), holes=holes)
+        return Contour(self.points, self.color, bbox=self.bbox, area=self.area, holes=holes, curves=curves)
+
 class PictureVectorizer(object):
-    def __init__(self, threshold=0.725, coeff=10.0, target_size=860, stroke_width=1.2, color='black', min_dist_threshold=3.85, close_trace_threshold=2.25):
+    def __init__(self, threshold=0.725, coeff=10.0, target_size=860, stroke_width=1.2, color='black', min_dist_threshold=3.85, close_trace_threshold=2.25, labeling="array", tracer="heads", compress_output=False, compact=False, tile_size=None, cache_dir=None, cache_size_limit=1<<30, simplify_tolerance=None, curve_tolerance=None, profile=False, profile_memory=False, holes="evenodd", draft_decode=False, resize="skimage", crop_bounds=None, rotate=False, min_area=0, min_bbox=0):
         self.threshold = threshold
         self.coeff = coeff
         self.target_size = target_size
@@ -13,12 +61,37 @@ class PictureVectorizer(object):
         self.color = color
         self.min_dist_threshold = min_dist_threshold
         self.close_trace_threshold = close_trace_threshold
+        self.labeling = labeling # "array" labels all components in one pass, "scan" explores clusters pixel by pixel
+        self.tracer = tracer # "heads" uses multi-head search, "border" follows cluster border in linear time
+        self.compress_output = compress_output # writes gzip-compressed .svgz files
+        self.compact = compact # keeps processed img as single-channel bool instead of 3-channel float
+        self.tile_size = tile_size # if set, processes imgs in tiles of this size via memory-mapped intermediates
+        self.cache_dir = cache_dir # if set, results are cached on disk keyed by img contents & params
+        self.cache_size_limit = cache_size_limit # bytes, least recently used results are evicted past this
+        self.result_cache = None # created on first use & kept, so its running size total lasts across imgs
+        self.simplify_tolerance = simplify_tolerance # if set, contours are traced at full resolution then simplified to within this many pixels
+        self.curve_tolerance = curve_tolerance # if set, contours are traced at full resolution then fitted by cubic beziers to within this many pixels
+        self.profile = profile or profile_memory # records time, calls & counts per stage, writing a json report per img
+        self.profile_memory = profile_memory # also records peak allocations per stage, though tracing allocations slows every stage down
+        self.profiler = StageProfiler(track_memory=profile_memory) if self.profile else NullProfiler()
+        self.draft_decode = draft_decode # decodes imgs at reduced scale close to target_size where supported (e.g. jpeg), rather than at full resolution
+        self.resize = resize # "skimage" rescales all channels with gaussian anti-aliasing, "area" averages to gray first then box-averages, faster & float32
+        self.crop_bounds = crop_bounds # if set, imgs are cropped to normalized (x_min, x_max, y_min, y_max) bounds, y from bottom, before any resampling
+        self.rotate = rotate # rotates imgs by 180 degrees before cropping
+        self.holes = holes # "evenodd" cuts holes out of enclosing cluster as compound paths, "overlay" draws them as white paths on top (always used by "scan" labeling)
+        self.min_area = min_area # components (dark clusters or enclosed white regions) with fewer pixels are skipped before tracing
+        self.min_bbox = min_bbox # components whose bbox is shorter than this many pixels on its longest side are skipped before tracing
 
     def traverse_to_point(self, contour_pixels, new_pixel, min_dist_threshold=3.0, force_traverse=False):
 
-        # adds new point to contour if exceeds min_dist_threshold
-        dist = np.linalg.norm(np.array(new_pixel) - np.array(contour_pixels[-1]))
-        if dist > min_dist_threshold or force_traverse:
+        # adds new point to contour if exceeds min_dist_threshold, with 0 threshold (simplify & curves) every new pixel is added without measuring
+        last_pixel = contour_pixels[-1]
+        if force_traverse:
+            contour_pixels.append(new_pixel)
+        elif min_dist_threshold <= 0:
+            if new_pixel[0] != last_pixel[0] or new_pixel[1] != last_pixel[1]:
+                contour_pixels.append(new_pixel)
+        elif (new_pixel[0]-last_pixel[0])**2 + (new_pixel[1]-last_pixel[1])**2 > min_dist_threshold * min_dist_threshold:
             contour_pixels.append(new_pixel)
 
         return contour_pixels
@@ -35,15 +108,21 @@ class PictureVectorizer(object):
                 return i
         return 1
 
-    def trace_cluster(self, offsets, starting_pixel, cluster_pixels_img, min_dist_threshold=3.85, close_trace_threshold=2.0, debug_prefix="0"): # returns list of pixels in cluster contour
+    def trace_cluster(self, offsets, starting_pixel, cluster_pixels_img, min_dist_threshold=3.85, close_trace_threshold=2.0, debug_prefix="0", origin=(0, 0), scratch_pool=None, debug=False): # returns (N, 2) array of pixels in cluster contour
+        starting_pixel = (starting_pixel[0]-origin[0], starting_pixel[1]-origin[1]) # cluster_pixels_img may only cover cluster bbox, traces in its local coords
         contour_pixels = [starting_pixel]
 
-        debug_img = np.zeros(cluster_pixels_img.shape)
+        # debug img of traced pixels, only allocated if requested
+        debug_img = None
+        if debug:
+            debug_img = np.zeros(cluster_pixels_img.shape)
+
+        if scratch_pool is None:
+            scratch_pool = ScratchBufferPool()
 
         heads = [[starting_pixel]]
         previous_head = None
-        explored_pixels_hash = {}
-        active_heads_hash = {str(starting_pixel[0])+" "+str(starting_pixel[1]): 1}
+        pixel_states = {starting_pixel: PIXEL_ACTIVE} # only pixels reached along border, rather than a bbox-sized array
         tries = 0
         while len(heads) > 0:
 
@@ -51,10 +130,8 @@ class PictureVectorizer(object):
             current_pixel = current_head[-1]
             tries += 1
 
-            cluster_pixels_img[0, current_pixel[0], current_pixel[1]] = 0.0
-            cluster_pixels_img[1, current_pixel[0], current_pixel[1]] = 1.0
-            cluster_pixels_img[2, current_pixel[0], current_pixel[1]] = 0.0
-            debug_img[:, current_pixel[0], current_pixel[1]] = 1.0
+            if debug:
+                debug_img[:, current_pixel[0], current_pixel[1]] = 1.0
 
             # TODO: replace with better algorithm
             # tracks last point/head and traverse to current point if huge gap
@@ -82,13 +159,11 @@ class PictureVectorizer(object):
             contour_pixels = self.traverse_to_point(contour_pixels, current_pixel, min_dist_threshold=min_dist_threshold)
 
             # marks current pixel as explored
-            explored_pixels_hash[str(current_pixel[0])+" "+str(current_pixel[1])] = 1
-            if str(current_pixel[0])+" "+str(current_pixel[1]) in active_heads_hash:
-                del active_heads_hash[str(current_pixel[0])+" "+str(current_pixel[1])]
+            pixel_states[current_pixel] = PIXEL_VISITED
 
             # constructs 3x-length list of neighbor pixels
             neighbors = []
-            proto_neighbors = self.get_neighbors(offsets, cluster_pixels_img, current_pixel, {}, include_white_pixels=True, include_corners=True)[0]
+            proto_neighbors = self.get_neighbors(offsets, cluster_pixels_img, current_pixel, None, include_white_pixels=True, include_corners=True)[0]
             for nbr in proto_neighbors:
                 neighbors.append(nbr)
             for nbr in proto_neighbors:
@@ -109,17 +184,17 @@ class PictureVectorizer(object):
                 prev_neighbor = neighbors[i-1]
 
                 # if neighboring pixel is a valid border pixel/head...
-                if str(neighbor[0])+" "+str(neighbor[1]) not in explored_pixels_hash and str(neighbor[0])+" "+str(neighbor[1]) not in active_heads_hash and cluster_pixels_img[0, neighbor[0], neighbor[1]] <= 0.5 and cluster_pixels_img[0, prev_neighbor[0], prev_neighbor[1]] > 0.5:
+                if pixel_states.get(neighbor, PIXEL_UNVISITED) == PIXEL_UNVISITED and cluster_pixels_img[0, neighbor[0], neighbor[1]] <= 0.5 and cluster_pixels_img[0, prev_neighbor[0], prev_neighbor[1]] > 0.5:
 
                     # starts new head for each valid border pixel
                     new_head = current_head[:]
                     new_head.append(neighbor)
 
                     heads.insert(num_new_heads, new_head)
-                    active_heads_hash[str(neighbor[0])+" "+str(neighbor[1])] = 1
+                    pixel_states[neighbor] = PIXEL_ACTIVE
                     num_new_heads += 1
 
-                elif str(neighbor[0])+" "+str(neighbor[1]) in active_heads_hash and str(neighbor[0])+" "+str(neighbor[1]) not in explored_pixels_hash:
+                elif pixel_states.get(neighbor, PIXEL_UNVISITED) == PIXEL_ACTIVE:
 
                     # finds corresponding head
                     neighbor_head = None
@@ -139,12 +214,11 @@ class PictureVectorizer(object):
                     new_head.append(neighbor)
 
                     heads.insert(num_new_heads, new_head)
-                    active_heads_hash[str(neighbor[0])+" "+str(neighbor[1])] = 1
+                    pixel_states[neighbor] = PIXEL_ACTIVE
                     num_new_heads += 1
                 elif neighbor == current_head[0] and len(current_head) > 11: # TODO: remove? might not be doing anything
                     num_new_heads = 0
                     heads = []
-                    active_heads_hash = {}
 
                     break
 
@@ -187,9 +261,85 @@ class PictureVectorizer(object):
 
             previous_head = current_head
 
-        return contour_pixels, debug_img
+        # translates contour from local to image coords
+        return np.array(contour_pixels, dtype=np.int32) + np.array(origin, dtype=np.int32), debug_img
+
+    def trace_cluster_border(self, offsets, starting_pixel, cluster_pixels_img, min_dist_threshold=3.85, origin=(0, 0), scratch_pool=None): # returns (N, 2) array of pixels in cluster contour
+        # every neighbor checked (& every backtrack) must be in bounds, so traces in place if exterior img is edged by background, otherwise in copy padded by 1 background pixel
+        exterior = cluster_pixels_img[0]
+        padding = 0 if exterior.dtype == bool and exterior.flags.c_contiguous and exterior[0].all() and exterior[-1].all() and exterior[:, 0].all() and exterior[:, -1].all() else 1
+        if padding:
+            if scratch_pool is None:
+                scratch_pool = ScratchBufferPool()
+            exterior = scratch_pool.get("border_mask", (exterior.shape[0]+2, exterior.shape[1]+2), bool, True)
+            np.greater(cluster_pixels_img[0], 0.5, out=exterior[1:-1, 1:-1])
+        exterior_bytes = memoryview(exterior.reshape(-1)).cast('B') # 1 byte per pixel (1 = outside), indexed faster than numpy from python without copying
+        starting_pixel = (starting_pixel[0]-origin[0]+padding, starting_pixel[1]-origin[1]+padding)
+        contour_pixels = [starting_pixel]
+
+        # Moore-neighbor tracing, offsets are sorted clockwise so each step searches clockwise from the last background pixel
+        height, width = exterior.shape
+        offset_idcs = {}
+        for i in range(len(offsets)):
+            offset_idcs[offsets[i]] = i
+
+        # starting pixel is first in raster order, so its left neighbor is outside cluster
+        backtrack = (starting_pixel[0], starting_pixel[1]-1)
+        current_pixel = starting_pixel
+        second_pixel = None
+        min_dist_sq = min_dist_threshold * min_dist_threshold
+        for step in range(4 * height * width): # safety bound, each border pixel is entered from at most 4 directions
+            direction_idx = offset_idcs[(backtrack[0]-current_pixel[0], backtrack[1]-current_pixel[1])]
+
+            next_pixel = None
+            for i in range(1, len(offsets)+1):
+                offset = offsets[(direction_idx+i) % len(offsets)]
+                pixel = (current_pixel[0]+offset[0], current_pixel[1]+offset[1])
+                if not exterior_bytes[pixel[0]*width + pixel[1]]:
+                    next_pixel = pixel
+                    break
+                backtrack = pixel
+
+            # isolated pixel
+            if next_pixel is None:
+                break
 
-    def get_neighbors(self, offsets, contrasted_img, parent_pixel, cluster_pixels_hash, include_white_pixels=False, include_corners=True):
+            # stops once first move out of starting pixel is about to be repeated, as border pixels (starting one included) may be passed more than once
+            if second_pixel is None:
+                second_pixel = next_pixel
+            elif current_pixel == starting_pixel and next_pixel == second_pixel:
+                break
+            current_pixel = next_pixel
+
+            # traverses to next point if far enough from last point
+            last_pixel = contour_pixels[-1]
+            if (current_pixel[0]-last_pixel[0])**2 + (current_pixel[1]-last_pixel[1])**2 > min_dist_sq:
+                contour_pixels.append(current_pixel)
+
+        # border traces are always closed, so traverses back to origin
+        if len(contour_pixels) > 1 and contour_pixels[-1] != starting_pixel:
+            contour_pixels.append(starting_pixel)
+
+        return np.array(contour_pixels, dtype=np.int32) + np.array((origin[0]-padding, origin[1]-padding), dtype=np.int32)
+
+    def trace_component(self, offsets, starting_pixel, cluster_pixels_img, color, bbox=None, area=0, origin=(0, 0), scratch_pool=None, debug_prefix="0"): # returns contour of cluster traced with configured tracer
+
+        # when simplifying or fitting curves, traces every border pixel and leaves point reduction to later stage
+        min_dist_threshold = self.min_dist_threshold
+        if self.simplify_tolerance is not None or self.curve_tolerance is not None:
+            min_dist_threshold = 0.0
+
+        with self.profiler.stage("trace_cluster"):
+            if self.tracer == "border":
+                pixels_in_cluster_contour = self.trace_cluster_border(offsets, starting_pixel, cluster_pixels_img, min_dist_threshold=min_dist_threshold, origin=origin, scratch_pool=scratch_pool)
+            else:
+                pixels_in_cluster_contour, debug_img = self.trace_cluster(offsets, starting_pixel, cluster_pixels_img, debug_prefix=debug_prefix, min_dist_threshold=min_dist_threshold, close_trace_threshold=self.close_trace_threshold, origin=origin, scratch_pool=scratch_pool)
+
+        self.profiler.count("clusters")
+        self.profiler.count("contour_points", len(pixels_in_cluster_contour))
+        return Contour(pixels_in_cluster_contour, color, bbox=bbox, area=area)
+
+    def get_neighbors(self, offsets, contrasted_img, parent_pixel, visited_mask, include_white_pixels=False, include_corners=True):
         valid_neighbors = []
 
         for offset in offsets:
@@ -203,7 +353,7 @@ class PictureVectorizer(object):
                 pixel = (parent_pixel[0]+i, parent_pixel[1]+j)
 
                 # marks valid neighbors that are within image bounds, infilled
-                if str(pixel[0])+" "+str(pixel[1]) not in cluster_pixels_hash and pixel[0] >= 0 and pixel[0] < contrasted_img.shape[1] and pixel[1] >= 0 and pixel[1] < contrasted_img.shape[2]:
+                if pixel[0] >= 0 and pixel[0] < contrasted_img.shape[1] and pixel[1] >= 0 and pixel[1] < contrasted_img.shape[2] and (visited_mask is None or visited_mask[pixel] == PIXEL_UNVISITED):
                     if not include_white_pixels and contrasted_img[0, pixel[0], pixel[1]] < 0.5:
                         valid_neighbors.append(pixel)
                     elif include_white_pixels:
@@ -211,32 +361,35 @@ class PictureVectorizer(object):
 
         return valid_neighbors, len(valid_neighbors) <= 7
 
-    def explore_cluster(self, offsets, contrasted_img, starting_pixel): # returns list of pixels in cluster
+    def explore_cluster(self, offsets, contrasted_img, starting_pixel, visited_mask=None, scratch_pool=None): # returns list of pixels in cluster, bool exterior img of cluster bbox (True = outside cluster) & its origin
         cluster_pixels = []
-        exterior_pixels_img = np.ones(contrasted_img.shape)
-        cluster_pixels_hash = {}
-        queue = [starting_pixel]
+        if visited_mask is None:
+            visited_mask = new_pixel_mask(contrasted_img)
+        queue = collections.deque([starting_pixel])
 
-        # BFS, finds all infilled pixels connected to a start pixel
+        # BFS, finds all infilled pixels connected to a start pixel, marking them in visited_mask
         while len(queue) > 0:
-            start_pixel = queue.pop(0)
+            start_pixel = queue.popleft()
 
-            if str(start_pixel[0])+" "+str(start_pixel[1]) not in cluster_pixels_hash:
+            if visited_mask[start_pixel] == PIXEL_UNVISITED:
                 cluster_pixels.append(start_pixel)
-                cluster_pixels_hash[str(start_pixel[0])+" "+str(start_pixel[1])] = 1
+                visited_mask[start_pixel] = PIXEL_VISITED
 
-                neighbors, is_exterior = self.get_neighbors(offsets, contrasted_img, start_pixel, cluster_pixels_hash, include_corners=True)
+                neighbors, is_exterior = self.get_neighbors(offsets, contrasted_img, start_pixel, visited_mask, include_corners=True)
                 for neighbor in neighbors:
                     queue.append(neighbor)
 
-                # also constructs outline/exterior of cluster
-                # if is_exterior:
-                exterior_pixels_img[:, start_pixel[0], start_pixel[1]] = 0.0
+        # also constructs outline/exterior of cluster, limited to its bbox plus a margin
+        if scratch_pool is None:
+            scratch_pool = ScratchBufferPool()
+        cluster_pixels_arr = np.array(cluster_pixels)
+        x_min, x_max, y_min, y_max = pad_bbox((cluster_pixels_arr[:, 0].min(), cluster_pixels_arr[:, 0].max()+1, cluster_pixels_arr[:, 1].min(), cluster_pixels_arr[:, 1].max()+1), contrasted_img.shape[1:])
+        exterior_pixels_img = scratch_pool.get("exterior", (1, x_max-x_min, y_max-y_min), bool, True)
+        exterior_pixels_img[0, cluster_pixels_arr[:, 0]-x_min, cluster_pixels_arr[:, 1]-y_min] = False
 
-        return cluster_pixels, exterior_pixels_img
+        return cluster_pixels, exterior_pixels_img, (x_min, y_min)
 
-    def find_clusters(self, contrasted_img):
-        clusters = []
+    def get_offsets(self):
 
         # creates neighborhood of pixels to search for each central pixel
         offsets = [] # must be sorted by outward spiral
@@ -246,103 +399,285 @@ class PictureVectorizer(object):
                     offsets.append((i, j))
         offsets.sort(key=lambda x: np.arctan2(x[0], x[1]))
 
+        return offsets
+
+    def find_clusters(self, contrasted_img):
+        return list(self.iter_clusters(contrasted_img))
+
+    def iter_clusters(self, contrasted_img): # yields contour of each cluster, with its hole contours, as soon as it is traced
+        if self.labeling == "scan":
+            return self.iter_clusters_scan(contrasted_img)
+        return self.iter_clusters_labeled(contrasted_img)
+
+    def label_components(self, contrasted_img): # returns components in raster order of their seeds, plus label arrays
+        dark_img = contrasted_img[0] < 0.5
+        structure = np.ones((3, 3), dtype=bool) # 8-connectivity, matches neighborhood used by explore_cluster
+
+        dark_labels, num_dark = scipy.ndimage.label(dark_img, structure=structure)
+        white_labels, num_white = scipy.ndimage.label(np.logical_not(dark_img), structure=structure)
+
+        # white regions touching the image border are background, never traced
+        border_labels = np.concatenate((white_labels[0, :], white_labels[-1, :], white_labels[:, 0], white_labels[:, -1]))
+        is_border_region = np.zeros(num_white+1, dtype=bool)
+        is_border_region[border_labels] = True
+
+        components = []
+        for labels, num_labels, is_white in ((dark_labels, num_dark, False), (white_labels, num_white, True)):
+            areas = np.bincount(labels.ravel(), minlength=num_labels+1)
+            for i, slices in enumerate(scipy.ndimage.find_objects(labels)):
+                label = i+1
+                if slices is None or (is_white and is_border_region[label]):
+                    continue
+
+                # seed is first pixel of component in raster order, always on top row of bbox
+                x_min, x_max = slices[0].start, slices[0].stop
+                y_min, y_max = slices[1].start, slices[1].stop
+                seed_y = y_min + int(np.argmax(labels[x_min, y_min:y_max] == label))
+
+                # pixel left of a hole's seed always belongs to the dark component enclosing it
+                parent = int(dark_labels[x_min, seed_y-1]) if is_white else None
+
+                components.append(ClusterComponent(label, (x_min, seed_y), (x_min, x_max, y_min, y_max), int(areas[label]), is_white=is_white, parent=parent))
+
+        components.sort(key=lambda c: c.seed)
+
+        return components, dark_labels, white_labels
+
+    def iter_clusters_labeled(self, contrasted_img):
+        offsets = self.get_offsets()
+
+        with self.profiler.stage("labeling"):
+            components, dark_labels, white_labels = self.label_components(contrasted_img)
+        self.profiler.count("pixels_visited", contrasted_img.shape[1] * contrasted_img.shape[2])
+        scratch_pool = ScratchBufferPool()
+
+        for component, holes in self.group_components(components):
+            labels = white_labels if component.is_white else dark_labels
+            contour = self.trace_labeled_component(offsets, component, labels, contrasted_img.shape[1:], scratch_pool)
+            contour.set_holes([self.trace_labeled_component(offsets, hole, white_labels, contrasted_img.shape[1:], scratch_pool) for hole in holes])
+            yield contour
+
+    def group_components(self, components): # returns (component, holes) pairs, holes grouped under their enclosing component unless drawn as overlays
+        components = self.skip_specks(components)
+
+        # holes of skipped dark components are skipped along with them, whether grouped or drawn as overlays
+        dark_labels = set([component.label for component in components if not component.is_white])
+        orphaned_holes = [component for component in components if component.is_white and component.parent not in dark_labels]
+        if len(orphaned_holes) > 0:
+            self.count_skipped_specks(orphaned_holes)
+            components = [component for component in components if not component.is_white or component.parent in dark_labels]
+
+        if self.holes == "overlay":
+            return [(component, []) for component in components]
+
+        holes = collections.defaultdict(list)
+        for component in components:
+            if component.is_white:
+                holes[component.parent].append(component)
+
+        return [(component, holes[component.label]) for component in components if not component.is_white]
+
+    def is_speck(self, area, bbox): # bbox is (x_min, x_max, y_min, y_max), max bounds exclusive
+        return area < self.min_area or max(bbox[1]-bbox[0], bbox[3]-bbox[2]) < self.min_bbox
+
+    def skip_specks(self, components): # returns components that aren't specks, counting skipped ones
+        if self.min_area <= 0 and self.min_bbox <= 0:
+            return components
+
+        kept_components = []
+        specks = []
+        for component in components:
+            if self.is_speck(component.area, component.bbox):
+                specks.append(component)
+            else:
+                kept_components.append(component)
+        self.count_skipped_specks(specks)
+
+        return kept_components
+
+    def count_skipped_specks(self, specks):
+        for speck in specks:
+            self.count_skipped_speck(speck.is_white, speck.area)
+
+    def count_skipped_speck(self, is_white, area):
+        self.profiler.count("white_specks_skipped" if is_white else "dark_specks_skipped")
+        self.profiler.count("speck_pixels_skipped", area)
+
+    def trace_labeled_component(self, offsets, component, labels, shape, scratch_pool, roots=None): # returns contour of component of label array, with labels mapped through roots if given
+        # constructs exterior img (True = outside component) limited to its bbox plus a margin, from label strips so components spanning a whole sheet never need bbox-sized label copies
+        # exterior img itself still takes 1 byte per bbox pixel, the one tracing cost not bounded by tile size (64 MB for a frame around an 8000x8000 sheet)
+        x_min, x_max, y_min, y_max = pad_bbox(component.bbox, shape)
+        exterior_pixels_img = scratch_pool.get("exterior", (1, x_max-x_min, y_max-y_min), bool, True)
+        strip_size = max(1, (1<<20) // max(y_max-y_min, 1))
+        for strip_x in range(x_min, x_max, strip_size):
+            strip_labels = np.asarray(labels[strip_x:min(strip_x+strip_size, x_max), y_min:y_max])
+            if roots is not None:
+                strip_labels = roots[strip_labels]
+            np.not_equal(strip_labels, component.label, out=exterior_pixels_img[0, strip_x-x_min:strip_x-x_min+len(strip_labels)])
+
+        # finds points in trace of cluster exterior
+        return self.trace_component(offsets, component.seed, exterior_pixels_img, "white" if component.is_white else self.color, bbox=component.bbox, area=component.area, origin=(x_min, y_min), scratch_pool=scratch_pool, debug_prefix=str(component.label))
+
+    def iter_clusters_scan(self, contrasted_img):
+        offsets = self.get_offsets()
+
         # debug_img = np.zeros(contrasted_img.shape)
         # debug_img_b = np.zeros(contrasted_img.shape)
 
         # explores clusters once a filled pixel is reached
-        clustered_pixels = {}
+        clustered_pixels = new_pixel_mask(contrasted_img)
+        scratch_pool = ScratchBufferPool()
         debug_count = 0
         # prepare_path("test_debug")
         for x in range(contrasted_img.shape[1]):
             for y in range(contrasted_img.shape[2]):
 
-                if contrasted_img[0, x, y] < 0.5 and str(x)+" "+str(y) not in clustered_pixels:
+                if contrasted_img[0, x, y] < 0.5 and clustered_pixels[x, y] == PIXEL_UNVISITED:
 
                     # rand_color = [random.random(), random.random(), random.random()]
-                    pixels_in_cluster, exterior_pixels_img = self.explore_cluster(offsets, contrasted_img, (x, y))
-
                     # marks pixels in cluster as previously visited, won't be revisited for cluster exploration
-                    for pixel in pixels_in_cluster:
-                        clustered_pixels[str(pixel[0])+" "+str(pixel[1])] = 1
+                    with self.profiler.stage("explore_cluster"):
+                        pixels_in_cluster, exterior_pixels_img, exterior_origin = self.explore_cluster(offsets, contrasted_img, (x, y), visited_mask=clustered_pixels, scratch_pool=scratch_pool)
+                    self.profiler.count("pixels_visited", len(pixels_in_cluster))
+
+                    # specks are still explored, so their pixels are marked visited, but never traced
+                    bbox = get_pixels_bbox(pixels_in_cluster)
+                    if self.is_speck(len(pixels_in_cluster), bbox):
+                        self.count_skipped_speck(False, len(pixels_in_cluster))
+                        clustered_pixels[tuple(np.array(pixels_in_cluster).T)] = PIXEL_SKIPPED # so white regions it encloses are skipped too
+                        continue
 
                     # debug_img += (1.0 - exterior_pixels_img) * np.expand_dims(np.expand_dims(rand_color, axis=-1), axis=-1)
 
                     # finds points in trace of cluster exterior
-                    pixels_in_cluster_contour, debug_img_b_component = self.trace_cluster(offsets, (x, y), exterior_pixels_img, debug_prefix=str(debug_count), min_dist_threshold=self.min_dist_threshold, close_trace_threshold=self.close_trace_threshold)
+                    yield self.trace_component(offsets, (x, y), exterior_pixels_img, self.color, bbox=bbox, area=len(pixels_in_cluster), origin=exterior_origin, scratch_pool=scratch_pool, debug_prefix=str(debug_count))
                     # debug_img_b += debug_img_b_component * np.expand_dims(np.expand_dims(rand_color, axis=-1), axis=-1)
 
-                    # adds cluster outline to output list
-                    current_pixels_in_cluster_contour = []
-                    for i in range(len(pixels_in_cluster_contour)):
-                        current_pixels_in_cluster_contour.append(pixels_in_cluster_contour[i])
-                    clusters.append((current_pixels_in_cluster_contour, self.color))
-
                     debug_count += 1
-                elif y >= 1 and contrasted_img[0, x, y] >= 0.5 and contrasted_img[0, x, y-1] < 0.5 and str(x)+" "+str(y) not in clustered_pixels:
+                elif y >= 1 and contrasted_img[0, x, y] >= 0.5 and contrasted_img[0, x, y-1] < 0.5 and clustered_pixels[x, y] == PIXEL_UNVISITED:
 
                     # if on any given horiz line, we go from cluster black pixel to white, explore white region
-                    pixels_in_cluster, exterior_pixels_img = self.explore_cluster(offsets, 1.0 - contrasted_img, (x, y))
-
                     # marks pixels in cluster as previously visited, won't be revisited for cluster exploration
+                    with self.profiler.stage("explore_cluster"):
+                        pixels_in_cluster, exterior_pixels_img, exterior_origin = self.explore_cluster(offsets, 1.0 - contrasted_img, (x, y), visited_mask=clustered_pixels, scratch_pool=scratch_pool)
+                    self.profiler.count("pixels_visited", len(pixels_in_cluster))
+
                     includes_border = False
                     for pixel in pixels_in_cluster:
-                        clustered_pixels[str(pixel[0])+" "+str(pixel[1])] = 1
-
                         if pixel[0] <= 0 or pixel[0] >= contrasted_img.shape[1]-1 or pixel[1] <= 0 or pixel[1] >= contrasted_img.shape[2]-1:
                             includes_border = True # if white region connects to border, keep memorized but ignore
 
                     # if white region does not connect to border, draw white region
-                    if not includes_border:
-                        pixels_in_cluster_contour, debug_img_b_component = self.trace_cluster(offsets, (x, y), exterior_pixels_img, debug_prefix=str(debug_count), min_dist_threshold=self.min_dist_threshold, close_trace_threshold=self.close_trace_threshold)
-
-                        # adds cluster outline to output list
-                        current_pixels_in_cluster_contour = []
-                        for i in range(len(pixels_in_cluster_contour)):
-                            current_pixels_in_cluster_contour.append(pixels_in_cluster_contour[i])
-                        clusters.append((current_pixels_in_cluster_contour, "white"))
+                    if includes_border:
+                        continue
+                    bbox = get_pixels_bbox(pixels_in_cluster)
+                    if self.is_speck(len(pixels_in_cluster), bbox) or clustered_pixels[x, y-1] == PIXEL_SKIPPED: # dark pixel left of seed is in enclosing cluster
+                        self.count_skipped_speck(True, len(pixels_in_cluster))
+                        continue
+                    yield self.trace_component(offsets, (x, y), exterior_pixels_img, "white", bbox=bbox, area=len(pixels_in_cluster), origin=exterior_origin, scratch_pool=scratch_pool, debug_prefix=str(debug_count))
 
-                        debug_count += 1
+                    debug_count += 1
 
         # preview_np_image(debug_img, "debug.png")
         # preview_np_image(debug_img_b, "debug_b.png")
 
-        return clusters
+    def vectorize_to_path(self, img, path): # returns stats of written clusters
+        return self.write_clusters_to_path(self.iter_clusters(img), img.shape[2], img.shape[1], path)
 
-    def vectorize_to_path(self, img, path):
-        header = "<?xml version='1.0' encoding='UTF-8' standalone='no'?>\n<!DOCTYPE svg PUBLIC '-//W3C//DTD SVG 1.1//EN' 'http://www.w3.org/Graphics/SVG/1.1/DTD/svg11.dtd'>\n"
-        footer = "</g>\n</svg>"
+    def is_contour_too_short(self, contour):
+        # culls full resolution contours that would have traced to fewer than 6 points spaced min_dist_threshold apart
+        return len(contour) < 2 or get_polyline_length(contour.points) < 6 * self.min_dist_threshold
 
-        header += "<svg width='"+str(img.shape[2])+"' height='"+str(img.shape[1])+"' viewBox='0.0 0.0 "+str(img.shape[2])+" "+str(img.shape[1])+"' xmlns='http://www.w3.org/2000/svg' xmlns:xlink='http://www.w3.org/1999/xlink'>\n"
-        header += "<rect fill='none' stroke='#000' x='0' y='0' width='"+str(img.shape[2])+"' height='"+str(img.shape[1])+"'/>\n"
-        header += "<g>\n"
+    def count_polyline_output(self, contour, stats): # counts traced points, & commands & path bytes contour would be written with as polylines thinned by min_dist_threshold
+        stats["points_traced"] += len(contour) + sum([len(hole) for hole in contour.holes])
 
-        # finds clusters (list of points in cluster trace) and draws each
-        for cluster_obj in self.find_clusters(img):
-            cluster = cluster_obj[0]
-            cluster_color = cluster_obj[1]
-            cluster_path = ""
+        subpaths = [thin_polyline(contour.points, self.min_dist_threshold)]
+        if len(subpaths[0]) < 6:
+            return
+        subpaths += [thin_polyline(hole.points, self.min_dist_threshold) for hole in contour.holes]
+        subpaths = [subpath for subpath in subpaths if len(subpath) >= 6]
+        stats["polyline_commands"] += sum([len(subpath)+1 for subpath in subpaths])
+        stats["polyline_path_bytes"] += len(" ".join([format_polyline_path(subpath) for subpath in subpaths]))
 
-            if len(cluster) >= 6:
-                if len(cluster) > 0:
-                    cluster_path += "M"+str(cluster[0][1])+" "+str(cluster[0][0])+" "
-                if len(cluster) > 1:
-                    for point in cluster[1:]:
-                        cluster_path += "L"+str(point[1])+" "+str(point[0])+" "
-                #     for i in range(1, len(cluster)):
-                #         cluster_path += "S"+str(cluster[i][1])+" "+str(cluster[i][0])+", "+str(cluster[i-1][1])+" "+str(cluster[i-1][0])+" "
-                    cluster_path += "Z"
+    def simplify_clusters(self, clusters, stats): # yields contours simplified to within simplify_tolerance, counting points before & after
+        # simplified contours are new objects, traced contours may be reused (e.g. by sweeps)
+        for contour in clusters:
+            self.count_polyline_output(contour, stats)
 
-            header += "<path d='"+cluster_path+"' fill='"+cluster_color+"' stroke-width='"+str(self.stroke_width)+"' stroke='"+self.color+"'/>\n"
+            if self.is_contour_too_short(contour):
+                yield contour.with_points(np.zeros((0, 2), dtype=np.int32))
+                continue
+
+            with self.profiler.stage("simplify"):
+                holes = [hole.with_points(simplify_polyline(hole.points, self.simplify_tolerance)) for hole in contour.holes if not self.is_contour_too_short(hole)]
+                contour = contour.with_points(simplify_polyline(contour.points, self.simplify_tolerance), holes=holes)
+            yield contour
 
-        header = header + footer
+    def fit_clusters(self, clusters, stats): # yields contours with cubic beziers fitted within curve_tolerance of their smoothed points
+        for contour in clusters:
+            self.count_polyline_output(contour, stats)
 
-        # file cleanup
-        if os.path.exists(path):
-            os.remove(path)
+            if self.is_contour_too_short(contour):
+                yield contour.with_points(np.zeros((0, 2), dtype=np.int32))
+                continue
 
-        f = open(path, 'w')
-        f.write(header)
-        f.close()
+            # light smoothing removes pixel staircase, which would otherwise force many short curves
+            with self.profiler.stage("fit_curves"):
+                holes = [hole.with_curves(fit_cubic_beziers(smooth_closed_polyline(hole.points, window=5), self.curve_tolerance)) for hole in contour.holes if not self.is_contour_too_short(hole)]
+                contour = contour.with_curves(fit_cubic_beziers(smooth_closed_polyline(contour.points, window=5), self.curve_tolerance), holes=holes)
+            yield contour
+
+    def write_clusters_to_path(self, clusters, width, height, path): # returns stats of written clusters, path may also be a binary file object
+        compress = self.compress_output or (isinstance(path, str) and path.lower().endswith(".svgz"))
+        stats = {"clusters": 0, "paths": 0, "points_traced": 0, "points": 0, "commands": 0, "bytes": 0, "path_bytes": 0, "polyline_commands": 0, "polyline_path_bytes": 0}
+
+        # simplified & fitted contours are already culled by length, so any polygon or curve is kept
+        min_points = 6
+        if self.curve_tolerance is not None:
+            clusters = self.fit_clusters(clusters, stats)
+            min_points = 1
+        elif self.simplify_tolerance is not None:
+            clusters = self.simplify_clusters(clusters, stats)
+            min_points = 3
+
+        # control points are written to whole pixels once tolerance allows, otherwise to tenths of a pixel
+        curve_precision = 0 if self.curve_tolerance is not None and self.curve_tolerance >= 1.0 else 1
+
+        # finds cluster contours and streams each to file as it is traced
+        with SVGWriter(path, width, height, compress=compress) as writer:
+            for contour in clusters:
+                with self.profiler.stage("svg_writing"):
+                    stats["clusters"] += 1 + len(contour.holes)
+
+                    # holes are subpaths of their enclosing cluster's path, cut out by even-odd filling
+                    subpaths = []
+                    if len(contour) >= min_points:
+                        subpaths = [contour] + [hole for hole in contour.holes if len(hole) >= min_points]
+
+                    cluster_path = []
+                    for subpath in subpaths:
+                        if subpath.curves is not None:
+                            stats["points"] += len(subpath.curves)+1
+                            stats["commands"] += len(subpath.curves)+2
+                            cluster_path.append(format_bezier_path(subpath.curves, precision=curve_precision))
+                        else:
+                            stats["points"] += len(subpath)
+                            stats["commands"] += len(subpath)+1
+                            cluster_path.append(format_polyline_path(subpath.points))
+                    if len(subpaths) > 0:
+                        stats["paths"] += 1
+                    cluster_path = " ".join(cluster_path)
+                    stats["path_bytes"] += len(cluster_path)
+
+                    writer.write_path(cluster_path, contour.color, self.stroke_width, self.color, fill_rule="evenodd" if len(subpaths) > 1 else None)
+
+        if self.simplify_tolerance is None and self.curve_tolerance is None:
+            stats["points_traced"] = stats["points"]
+            stats["polyline_commands"] = stats["commands"]
+            stats["polyline_path_bytes"] = stats["path_bytes"]
+        stats["bytes"] = os.path.getsize(path) if isinstance(path, str) else path.tell()
+
+        return stats
 
     def extract_dark_points(self, img, threshold=0.75):
         img = img > threshold
@@ -352,58 +687,612 @@ class PictureVectorizer(object):
         return 1./(1. + np.exp(-coeff * (img - 0.5)))
 
     def process_numpy_img(self, img):
+        return self.process_rescaled_img(self.rescale_to_target(img))
+
+    def rescale_to_target(self, img): # rescales img so its longest side is target_size
 
         # rescales img if needed
-        ratio = 1.0
-        if img.shape[1] > img.shape[2]:
-            ratio = self.target_size / img.shape[1]
-        else:
-            ratio = self.target_size / img.shape[2]
+        ratio = self.get_rescale_ratio(img.shape[1:])
         # print(" * Rescaling img from "+str(img.shape[1:])+"...")
-        img = rescale(img, scale_factor=ratio)
+        with self.profiler.stage("rescale"):
+            img = self.rescale_img(img, ratio)
         # print(" ...to "+str(img.shape[1:]))
-        
-        # black & white-ifies img
-        img = np.expand_dims(np.mean(img, axis=0), axis=0)
-        
-        # adjusts exposure & other processing
-        img = self.adjust_exposure(img, coeff=self.coeff)
-        img = self.extract_dark_points(img, threshold=self.threshold)
-
-        # dilates pixels to prevent channel traversal issues
-        img = 1.0 - img
-        img = np.clip(img[:, :-1, :-1] + img[:, :-1, 1:] + img[:, 1:, :-1] + img[:, 1:, 1:], 0.0, 1.0)
-        img = 1.0 - img
-
-        # expands image with small white pixel border
-        img = np.pad(img, ((0,0),(2,2),(2,2)), 'constant', constant_values=((1,1),(1,1),(1,1)))
-
-        # expands sharp corners to prevent corner jumping
-        corner_mask_a = np.logical_and(np.logical_and(np.logical_and(1.0 - img[:, :-1, :-1], 1.0 - img[:, 1:, 1:]), img[:, 1:, :-1]), img[:, :-1, 1:])
-        corner_mask_b = np.logical_and(np.logical_and(np.logical_and(img[:, :-1, :-1], img[:, 1:, 1:]), 1.0 - img[:, 1:, :-1]), 1.0 - img[:, :-1, 1:])
-        img[:, 1:, :-1] = img[:, 1:, :-1] * (1.0 - corner_mask_a)
-        img[:, :-1, 1:] = img[:, :-1, 1:] * (1.0 - corner_mask_a)
-        img[:, 1:, 1:] = img[:, 1:, 1:] * (1.0 - corner_mask_b)
-        img[:, :-1, :-1] = img[:, :-1, :-1] * (1.0 - corner_mask_b)
-
-        img = np.tile(img, [3, 1, 1])
+
         return img
 
-    def process_img_at_path(self, path, output_path="test.svg", include_inputs=True):
-        img = load_np_image(path)
-        img = self.process_numpy_img(img)
-        if include_inputs:
-            preview_np_image(img, output_path.replace("_out", "").replace(".svg", "_in_processed.png"))
+    def process_rescaled_img(self, img): # thresholds & dilates rescaled img, returning contrasted img for tracing
+        if self.compact:
+            return self.process_rescaled_img_compact(img)
+
+        with self.profiler.stage("exposure"):
+            # black & white-ifies img
+            img = np.expand_dims(np.mean(img, axis=0), axis=0)
+
+            # adjusts exposure & other processing
+            img = self.adjust_exposure(img, coeff=self.coeff)
+            img = self.extract_dark_points(img, threshold=self.threshold)
 
-        self.vectorize_to_path(img, output_path)
+        with self.profiler.stage("dilation"):
+            # dilates pixels to prevent channel traversal issues
+            img = 1.0 - img
+            img = np.clip(img[:, :-1, :-1] + img[:, :-1, 1:] + img[:, 1:, :-1] + img[:, 1:, 1:], 0.0, 1.0)
+            img = 1.0 - img
 
-    def process_batch(self, batch_path, output_path="test"):
-        prepare_path(output_path)
+            # expands image with small white pixel border
+            img = np.pad(img, ((0,0),(2,2),(2,2)), 'constant', constant_values=((1,1),(1,1),(1,1)))
 
-        for filename in os.listdir(batch_path):
-            if ".jpg" in filename.lower() or ".jpeg" in filename.lower() or ".png" in filename.lower():
-                print(" * Processing "+filename+"...")
-                self.process_img_at_path(os.path.join(batch_path, filename), os.path.join(output_path, filename.split(".")[0]+".svg"), include_inputs=False)
+            # expands sharp corners to prevent corner jumping
+            corner_mask_a = np.logical_and(np.logical_and(np.logical_and(1.0 - img[:, :-1, :-1], 1.0 - img[:, 1:, 1:]), img[:, 1:, :-1]), img[:, :-1, 1:])
+            corner_mask_b = np.logical_and(np.logical_and(np.logical_and(img[:, :-1, :-1], img[:, 1:, 1:]), 1.0 - img[:, 1:, :-1]), 1.0 - img[:, :-1, 1:])
+            img[:, 1:, :-1] = img[:, 1:, :-1] * (1.0 - corner_mask_a)
+            img[:, :-1, 1:] = img[:, :-1, 1:] * (1.0 - corner_mask_a)
+            img[:, 1:, 1:] = img[:, 1:, 1:] * (1.0 - corner_mask_b)
+            img[:, :-1, :-1] = img[:, :-1, :-1] * (1.0 - corner_mask_b)
 
+            img = np.tile(img, [3, 1, 1])
+        return img
+
+    def process_rescaled_img_compact(self, img): # same processing as process_rescaled_img, but returns single-channel bool img (True = white)
 
+        # black & white-ifies img
+        with self.profiler.stage("exposure"):
+            gray_img = np.mean(img, axis=0)
+            del img
+            white_img = self.threshold_gray_img(gray_img)
+            del gray_img
+
+        with self.profiler.stage("dilation"):
+
+            # dilates pixels to prevent channel traversal issues
+            white_img = white_img[:-1, :-1] & white_img[:-1, 1:] & white_img[1:, :-1] & white_img[1:, 1:]
+
+            # expands image with small white pixel border
+            white_img = np.pad(white_img, ((2,2),(2,2)), 'constant', constant_values=True)
+
+            self.expand_sharp_corners(white_img)
+
+        return np.expand_dims(white_img, axis=0)
+
+    def threshold_gray_img(self, gray_img): # returns bool img, True where exposure-adjusted gray value passes threshold
+
+        # exposure adjustment is monotonic, so thresholding it is a threshold on gray value
+        if self.coeff > 0.0 and 0.0 < self.threshold < 1.0:
+            gray_threshold = 0.5 - (np.log(1.0 / self.threshold - 1.0) / self.coeff)
+            white_img = gray_img > gray_threshold
+
+            # values within rounding error of threshold are decided exactly as process_numpy_img does
+            borderline = np.abs(gray_img - gray_threshold) < 1e-9
+            if borderline.any():
+                white_img[borderline] = self.extract_dark_points(self.adjust_exposure(gray_img[borderline], coeff=self.coeff), threshold=self.threshold)
+            return white_img
+
+        return self.extract_dark_points(self.adjust_exposure(gray_img, coeff=self.coeff), threshold=self.threshold)
+
+    def expand_sharp_corners(self, white_img): # expands sharp corners of 2D bool img in place to prevent corner jumping
+        corner_mask_a = ~white_img[:-1, :-1] & ~white_img[1:, 1:] & white_img[1:, :-1] & white_img[:-1, 1:]
+        corner_mask_b = white_img[:-1, :-1] & white_img[1:, 1:] & ~white_img[1:, :-1] & ~white_img[:-1, 1:]
+        white_img[1:, :-1] &= ~corner_mask_a
+        white_img[:-1, 1:] &= ~corner_mask_a
+        white_img[1:, 1:] &= ~corner_mask_b
+        white_img[:-1, :-1] &= ~corner_mask_b
+
+    def rescale_img(self, img, ratio): # rescales (C, H, W) img with configured backend, gray backends return a single channel
+        if self.resize == "area":
+            return rescale_gray_area(img, scale_factor=ratio)
+        return rescale(img, scale_factor=ratio)
+
+    def get_rescale_ratio(self, img_shape): # img_shape is (height, width)
+        if img_shape[0] > img_shape[1]:
+            return self.target_size / img_shape[0]
+        return self.target_size / img_shape[1]
+
+    def preprocess_tiled(self, src_img, bitmap, tile_size=1024): # fills bitmap (same layout as compact process_numpy_img output, without channel axis) tile by tile from (H, W, 3) uint8 src_img
+        rescaled_shape = (bitmap.shape[0]-3, bitmap.shape[1]-3)
+
+        # source region read per tile grows with downscaling, so bitmap tiles shrink to keep it around tile_size squared
+        scale = max(src_img.shape[0] / rescaled_shape[0], src_img.shape[1] / rescaled_shape[1], 1.0)
+        for tile_x, tile_y in iter_tiles(bitmap.shape, max(int(tile_size / scale), 16)):
+
+            # window around tile with enough margin for dilation & corner expansion, in bitmap coords
+            window_x = (max(tile_x[0]-2, 0), min(tile_x[1]+2, bitmap.shape[0]))
+            window_y = (max(tile_y[0]-2, 0), min(tile_y[1]+2, bitmap.shape[1]))
+            window = np.ones((window_x[1]-window_x[0], window_y[1]-window_y[0]), dtype=bool)
+
+            # rescaled rows & cols needed for dilated pixels in window, bitmap is offset by 2 pixel border
+            gray_x = (max(window_x[0]-2, 0), min(window_x[1]-1, rescaled_shape[0]))
+            gray_y = (max(window_y[0]-2, 0), min(window_y[1]-1, rescaled_shape[1]))
+            if gray_x[1]-gray_x[0] >= 2 and gray_y[1]-gray_y[0] >= 2:
+                white_img = self.threshold_gray_img(resample_gray_region(src_img, rescaled_shape, gray_x, gray_y))
+                white_img = white_img[:-1, :-1] & white_img[:-1, 1:] & white_img[1:, :-1] & white_img[1:, 1:]
+                window[gray_x[0]+2-window_x[0]:gray_x[0]+2-window_x[0]+white_img.shape[0], gray_y[0]+2-window_y[0]:gray_y[0]+2-window_y[0]+white_img.shape[1]] = white_img
+
+            self.expand_sharp_corners(window)
+            bitmap[tile_x[0]:tile_x[1], tile_y[0]:tile_y[1]] = window[tile_x[0]-window_x[0]:tile_x[1]-window_x[0], tile_y[0]-window_y[0]:tile_y[1]-window_y[0]]
+
+    def label_components_tiled(self, bitmap, scratch_dir, tile_size=1024): # labels 2D bool bitmap (True = white) tile by tile, returns components & memory-mapped label arrays
+        structure = np.ones((3, 3), dtype=bool)
+        all_labels = []
+        components = []
+
+        for is_white in (False, True):
+            labels = np.lib.format.open_memmap(os.path.join(scratch_dir, ("white" if is_white else "dark")+"_labels.npy"), mode='w+', dtype=np.int32, shape=bitmap.shape)
+
+            # labels each tile separately, with tile labels offset to be unique across image
+            num_labels = 0
+            stats = [np.zeros((1, 6), dtype=np.int64)] # x_min, x_max, y_min, y_max, area, seed index
+            for tile_x, tile_y in iter_tiles(bitmap.shape, tile_size):
+                tile = np.asarray(bitmap[tile_x[0]:tile_x[1], tile_y[0]:tile_y[1]])
+                tile_labels, num_tile_labels = scipy.ndimage.label(tile if is_white else np.logical_not(tile), structure=structure)
+
+                tile_stats = np.zeros((num_tile_labels, 6), dtype=np.int64)
+                areas = np.bincount(tile_labels.ravel(), minlength=num_tile_labels+1)
+                for i, slices in enumerate(scipy.ndimage.find_objects(tile_labels)):
+                    seed_y = slices[1].start + int(np.argmax(tile_labels[slices[0].start, slices[1]] == i+1))
+                    tile_stats[i] = (tile_x[0]+slices[0].start, tile_x[0]+slices[0].stop, tile_y[0]+slices[1].start, tile_y[0]+slices[1].stop, areas[i+1], (tile_x[0]+slices[0].start)*bitmap.shape[1] + tile_y[0]+seed_y)
+                stats.append(tile_stats)
+
+                labels[tile_x[0]:tile_x[1], tile_y[0]:tile_y[1]] = np.where(tile_labels > 0, tile_labels + num_labels, 0)
+                num_labels += num_tile_labels
+            stats = np.concatenate(stats, axis=0)
+
+            # stitches labels of 8-connected pixels across tile seams
+            union_find = UnionFind(num_labels+1)
+            for seam_x in range(tile_size, bitmap.shape[0], tile_size):
+                union_find.union_adjacent_lines(labels[seam_x-1, :], labels[seam_x, :])
+            for seam_y in range(tile_size, bitmap.shape[1], tile_size):
+                union_find.union_adjacent_lines(labels[:, seam_y-1], labels[:, seam_y])
+            roots = union_find.roots()
+
+            # merges stats of stitched labels into their root labels
+            np.minimum.at(stats[:, 0], roots, stats[:, 0])
+            np.maximum.at(stats[:, 1], roots, stats[:, 1])
+            np.minimum.at(stats[:, 2], roots, stats[:, 2])
+            np.maximum.at(stats[:, 3], roots, stats[:, 3])
+            np.minimum.at(stats[:, 5], roots, stats[:, 5])
+            areas = np.bincount(roots, weights=stats[:, 4], minlength=num_labels+1).astype(np.int64)
+
+            for label in np.nonzero(roots == np.arange(num_labels+1))[0][1:]:
+                x_min, x_max, y_min, y_max, seed_idx = [int(value) for value in stats[label, [0, 1, 2, 3, 5]]]
+
+                # white regions touching the image border are background, never traced
+                if is_white and (x_min == 0 or y_min == 0 or x_max == bitmap.shape[0] or y_max == bitmap.shape[1]):
+                    continue
+
+                seed = (seed_idx // bitmap.shape[1], seed_idx % bitmap.shape[1])
+                parent = None
+                if is_white:
+                    dark_labels, dark_roots = all_labels[0]
+                    parent = int(dark_roots[dark_labels[seed[0], seed[1]-1]])
+
+                components.append(ClusterComponent(int(label), seed, (x_min, x_max, y_min, y_max), int(areas[label]), is_white=is_white, parent=parent))
+
+            all_labels.append((labels, roots))
+
+        components.sort(key=lambda c: c.seed)
+
+        return components, all_labels[0], all_labels[1]
+
+    def iter_clusters_tiled(self, bitmap, scratch_dir, tile_size=1024): # yields contour of each cluster of a memory-mapped 2D bool bitmap, with its hole contours
+        offsets = self.get_offsets()
+        with self.profiler.stage("labeling"):
+            components, dark_labels, white_labels = self.label_components_tiled(bitmap, scratch_dir, tile_size=tile_size)
+        self.profiler.count("pixels_visited", bitmap.shape[0] * bitmap.shape[1])
+        scratch_pool = ScratchBufferPool()
+
+        # only part of label arrays in component bbox is read from disk
+        for component, holes in self.group_components(components):
+            labels, roots = white_labels if component.is_white else dark_labels
+            contour = self.trace_labeled_component(offsets, component, labels, bitmap.shape, scratch_pool, roots=roots)
+            contour.set_holes([self.trace_labeled_component(offsets, hole, white_labels[0], bitmap.shape, scratch_pool, roots=white_labels[1]) for hole in holes])
+            yield contour
+
+    def process_tiled_img_at_path(self, path, output_path="test.svg", include_inputs=True, cache=None, cache_key=None): # vectorizes img via disk-backed intermediates, decoding & labeling memory is bounded by tile size, tracing by 1 byte per pixel of largest component's bbox
+        scratch_dir = tempfile.mkdtemp(prefix="vectorizer_tiles_")
+        try:
+            with self.profiler.stage("load"):
+                src_img = load_np_image_memmap(path, os.path.join(scratch_dir, "source.npy"))
+
+            # crops as a view, so only cropped region is read from disk
+            if self.rotate:
+                src_img = src_img[::-1, ::-1]
+            if self.crop_bounds is not None:
+                rows, cols = get_crop_slices(src_img.shape[:2], self.crop_bounds)
+                src_img = src_img[rows, cols]
+
+            ratio = self.get_rescale_ratio(src_img.shape[:2])
+            rescaled_shape = (max(int(np.round(src_img.shape[0] * ratio)), 1), max(int(np.round(src_img.shape[1] * ratio)), 1))
+
+            bitmap = np.lib.format.open_memmap(os.path.join(scratch_dir, "bitmap.npy"), mode='w+', dtype=bool, shape=(rescaled_shape[0]+3, rescaled_shape[1]+3))
+            with self.profiler.stage("preprocess_tiled"):
+                self.preprocess_tiled(src_img, bitmap, tile_size=self.tile_size)
+            if include_inputs:
+                pilImage.fromarray(np.asarray(bitmap)).save(get_preview_path(output_path))
+
+            stats = self.write_clusters_to_path(self.iter_clusters_tiled(bitmap, scratch_dir, tile_size=self.tile_size), bitmap.shape[1], bitmap.shape[0], output_path)
+            if cache is not None:
+                cache.store(cache_key, output_path, bitmap)
+            del src_img, bitmap
+        finally:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+        return stats
+
+    def load_img(self, path): # decodes img at path (or file object), cropped & rotated as configured
+        return to_float_np_image(self.decode_img(path))
+
+    def decode_img(self, path): # as load_img, but leaves img 8-bit
+        return decode_np_image(path, target_size=self.target_size if self.draft_decode else None, crop_bounds=self.crop_bounds, rotate=self.rotate)
+
+    def get_params(self): # returns every parameter affecting output, used to key cached results
+        return {
+            "threshold": self.threshold,
+            "coeff": self.coeff,
+            "target_size": self.target_size,
+            "stroke_width": self.stroke_width,
+            "color": self.color,
+            "min_dist_threshold": self.min_dist_threshold,
+            "close_trace_threshold": self.close_trace_threshold,
+            "labeling": self.labeling,
+            "tracer": self.tracer,
+            "compress_output": self.compress_output,
+            "compact": self.compact,
+            "tile_size": self.tile_size,
+            "simplify_tolerance": self.simplify_tolerance,
+            "curve_tolerance": self.curve_tolerance,
+            "holes": self.holes,
+            "draft_decode": self.draft_decode,
+            "resize": self.resize,
+            "crop_bounds": list(self.crop_bounds) if self.crop_bounds is not None else None,
+            "rotate": self.rotate,
+            "min_area": self.min_area,
+            "min_bbox": self.min_bbox,
+        }
+
+    def get_result_cache(self):
+        if self.result_cache is None:
+            self.result_cache = ResultCache(self.cache_dir, size_limit=self.cache_size_limit)
+        return self.result_cache
+
+    def process_img_at_path(self, path, output_path="test.svg", include_inputs=True, file_hash=None): # returns stats of written clusters, None if cached, file_hash of input can be given if already known
+        self.profiler.reset()
+        try:
+
+            # cache hits skip decoding, preprocessing & tracing entirely
+            cache = None
+            cache_key = None
+            if self.cache_dir is not None:
+                cache = self.get_result_cache()
+                cache_key = cache.make_key(path, self.get_params(), file_hash=file_hash)
+                if cache.fetch(cache_key, output_path, preview_path=get_preview_path(output_path) if include_inputs else None):
+                    return None
+
+            if self.tile_size is not None:
+                return self.process_tiled_img_at_path(path, output_path=output_path, include_inputs=include_inputs, cache=cache, cache_key=cache_key)
+
+            with self.profiler.stage("load"):
+                img = self.load_img(path)
+            img = self.process_numpy_img(img)
+            if include_inputs:
+                preview_np_image(img, get_preview_path(output_path))
+
+            stats = self.vectorize_to_path(img, output_path)
+            if cache is not None:
+                cache.store(cache_key, output_path, img[0] >= 0.5)
+
+            return stats
+        finally:
+            if self.profile:
+                write_json(self.profiler.get_report(path), get_profile_path(output_path))
+
+    def process_batch(self, batch_path, output_path="test", workers=1, chunk_size=1, timeout=None, incremental=False, pipeline=False, read_threads=2, compute_threads=1, write_threads=1, queue_size=4, mp_context=None): # returns summary of batch items in input order, worker processes started with mp_context if given
+        if pipeline and workers > 1:
+            raise ValueError("pipelined batches compute in threads, set compute_threads instead of workers")
+
+        # incremental runs keep existing outputs, only reprocessing files that are new or changed since they were recorded in manifest
+        if incremental:
+            os.makedirs(output_path, exist_ok=True)
+        else:
+            prepare_path(output_path)
+        manifest = BatchManifest(os.path.join(output_path, "manifest.jsonl"), load_existing=incremental)
+        params = self.get_params()
+
+        batch_entries = []
+        for entry in os.scandir(batch_path):
+            if entry.is_file() and (".jpg" in entry.name.lower() or ".jpeg" in entry.name.lower() or ".png" in entry.name.lower()):
+                batch_entries.append(entry)
+        batch_entries.sort(key=lambda entry: entry.name)
+
+        batch_items = []
+        skipped_results = {}
+        for entry in batch_entries:
+            output_filename = entry.name.split(".")[0]+(".svgz" if self.compress_output else ".svg")
+            if incremental and manifest.is_up_to_date(entry, params, output_filename, output_path):
+                skipped_results[entry.path] = new_batch_result(entry.path, os.path.join(output_path, output_filename), status="skipped")
+                skipped_results[entry.path]["hash"] = manifest.records[entry.name]["hash"]
+                skipped_results[entry.path]["stat"] = entry.stat()
+            else:
+                batch_items.append((self, entry.path, os.path.join(output_path, output_filename), timeout))
+        if incremental:
+            print(" * Skipping "+str(len(skipped_results))+" up-to-date files, processing "+str(len(batch_items)))
+
+        # processes files in worker pool or pipeline if requested, results reported in input order (pipeline: completion order)
+        start_time = time.time()
+        processed_results = {}
+        if pipeline:
+            if timeout is not None:
+                print(" * Per-file timeouts are not enforced in pipelined batches")
+            results = self.iter_batch_pipelined(batch_items, read_threads=read_threads, compute_threads=compute_threads, write_threads=write_threads, queue_size=queue_size)
+        elif workers > 1:
+            results = self.iter_batch_pooled(batch_items, workers=workers, chunk_size=chunk_size, mp_context=mp_context)
+        else:
+            results = map(process_batch_item, batch_items)
+
+        try:
+            for result in results:
+                print(" * Processed "+os.path.basename(result["input"])+": "+result["status"]+" ("+("%.2f" % result["seconds"])+"s)"+("" if result["error"] is None else " - "+result["error"])+("" if result["stats"] is None else ", "+format_stats(result["stats"])))
+                processed_results[result["input"]] = result
+
+                # records each finished output right away, so an interrupted run can resume
+                if result["status"] == "ok":
+                    manifest.record(os.path.basename(result["input"]), result["stat"], result["hash"], params, os.path.basename(result["output"]))
+        finally:
+            if hasattr(results, "close"):
+                results.close() # shuts down worker processes if interrupted
+            manifest.close()
+
+        summary = []
+        for entry in batch_entries:
+            summary.append(skipped_results[entry.path] if entry.path in skipped_results else processed_results[entry.path])
+
+        # aggregates per-image profiles over batch
+        if self.profile:
+            write_json(aggregate_profile_reports([result["profile"] for result in summary if result["profile"] is not None]), os.path.join(output_path, "profile.json"))
+
+        elapsed_time = time.time() - start_time
+        num_ok = len([result for result in processed_results.values() if result["status"] == "ok"])
+        print(" * Batch complete: "+str(num_ok)+"/"+str(len(processed_results))+" files ok in "+("%.2f" % elapsed_time)+"s ("+("%.2f" % (len(processed_results) / max(elapsed_time, 1e-9)))+" files/s)"+(", "+str(len(skipped_results))+" up to date" if incremental else ""))
+
+        return summary
+
+    def iter_batch_pooled(self, batch_items, workers=2, chunk_size=1, mp_context=None): # yields results of batch items in input order, recording files whose worker process dies rather than waiting on them forever
+        chunks = [batch_items[i:i+chunk_size] for i in range(0, len(batch_items), chunk_size)]
+        next_chunk_idx = 0
+        pending = collections.deque()
+        executor = concurrent.futures.ProcessPoolExecutor(workers, mp_context=mp_context)
+        try:
+            while next_chunk_idx < len(chunks) or len(pending) > 0:
+
+                # keeps few chunks in flight per worker, so a dying worker takes few files down with it
+                while next_chunk_idx < len(chunks) and len(pending) < 2 * workers:
+                    pending.append((chunks[next_chunk_idx], executor.submit(process_batch_chunk, chunks[next_chunk_idx])))
+                    next_chunk_idx += 1
+
+                chunk, future = pending.popleft()
+                try:
+                    results = future.result()
+                except concurrent.futures.BrokenExecutor:
+
+                    # a file in flight killed its worker, which one is found by retrying unfinished chunks one file at a time in a process of its own
+                    unfinished_chunks = [chunk] + [pending_chunk for pending_chunk, pending_future in pending]
+                    finished_futures = [None] + [pending_future if pending_future.done() and pending_future.exception() is None else None for pending_chunk, pending_future in pending]
+                    pending.clear()
+                    executor.shutdown(wait=True)
+                    executor = concurrent.futures.ProcessPoolExecutor(workers, mp_context=mp_context)
+
+                    for unfinished_chunk, finished_future in zip(unfinished_chunks, finished_futures):
+                        if finished_future is not None:
+                            yield from finished_future.result()
+                        else:
+                            for batch_item in unfinished_chunk:
+                                yield process_batch_item_isolated(batch_item, mp_context=mp_context)
+                    continue
+
+                yield from results
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def iter_batch_pipelined(self, batch_items, read_threads=2, compute_threads=1, write_threads=1, queue_size=4): # yields results of batch items as they finish
+        # reading & decoding, computing and writing overlap in separate threads, bounded queues between them limit imgs held in memory
+        if len(batch_items) == 0:
+            return
+        cache = self.get_result_cache() if self.cache_dir is not None else None
+
+        input_queue = queue.Queue()
+        for processor, input_path, output_path, timeout in batch_items:
+            result = new_batch_result(input_path, output_path)
+            input_queue.put({"result": result, "cache": cache, "cache_key": None, "cached": False})
+        for i in range(read_threads):
+            input_queue.put(None)
+        decoded_queue = queue.Queue(maxsize=queue_size)
+        computed_queue = queue.Queue(maxsize=queue_size)
+        result_queue = queue.Queue()
+
+        # each compute thread gets its own processor copy, so profiles aren't mixed
+        compute_fns = []
+        for i in range(compute_threads):
+            processor = copy.copy(self)
+            processor.profiler = StageProfiler(track_memory=self.profile_memory) if self.profile else NullProfiler()
+            compute_fns.append(processor.compute_pipeline_item)
+
+        start_pipeline_stage([self.read_pipeline_item] * read_threads, input_queue, decoded_queue, num_consumers=compute_threads)
+        start_pipeline_stage(compute_fns, decoded_queue, computed_queue, num_consumers=write_threads)
+        start_pipeline_stage([self.write_pipeline_item] * write_threads, computed_queue, result_queue)
+
+        while True:
+            item = result_queue.get()
+            if item is None:
+                break
+            yield item["result"]
+
+    def read_pipeline_item(self, item): # reads & decodes input of pipelined batch item, or fetches its output from cache
+        result = item["result"]
+        start_time = time.time()
+        try:
+            # stat for batch manifest is taken before reading, hash is of bytes decoded
+            result["stat"] = os.stat(result["input"])
+            with open(result["input"], 'rb') as f:
+                data = f.read()
+            result["hash"] = hashlib.sha256(data).hexdigest()
+
+            if item["cache"] is not None:
+                item["cache_key"] = item["cache"].make_key(result["input"], self.get_params(), file_hash=result["hash"])
+                item["cached"] = item["cache"].fetch(item["cache_key"], result["output"])
+
+            # tiled imgs are streamed from disk by compute stage instead, others are queued 8-bit & converted to float once computed
+            if not item["cached"] and self.tile_size is None:
+                item["img"] = self.decode_img(io.BytesIO(data))
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = type(e).__name__+": "+str(e)
+        result["seconds"] += time.time() - start_time
+        return item
+
+    def compute_pipeline_item(self, item): # vectorizes decoded img of pipelined batch item into an in-memory svg
+        result = item["result"]
+        if result["status"] != "ok" or item["cached"]:
+            return item
+
+        start_time = time.time()
+        self.profiler.reset()
+        try:
+            if self.tile_size is not None:
+                result["stats"] = self.process_tiled_img_at_path(result["input"], result["output"], include_inputs=False, cache=item["cache"], cache_key=item["cache_key"])
+            else:
+                img = self.process_numpy_img(to_float_np_image(item.pop("img")))
+                item["svg"] = io.BytesIO()
+                result["stats"] = self.vectorize_to_path(img, item["svg"])
+                item["bitmap"] = img[0] >= 0.5
+            if self.profile:
+                result["profile"] = self.profiler.get_report(result["input"])
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = type(e).__name__+": "+str(e)
+        result["seconds"] += time.time() - start_time
+        return item
+
+    def write_pipeline_item(self, item): # writes svg of pipelined batch item to its output path, caching it if enabled
+        result = item["result"]
+        start_time = time.time()
+        try:
+            if result["status"] == "ok" and "svg" in item:
+                with open(result["output"], 'wb') as f:
+                    f.write(item.pop("svg").getbuffer())
+                if item["cache"] is not None:
+                    item["cache"].store(item["cache_key"], result["output"], item.pop("bitmap"))
+            if result["profile"] is not None:
+                write_json(result["profile"], get_profile_path(result["output"]))
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = type(e).__name__+": "+str(e)
+        result["seconds"] += time.time() - start_time
+
+        if result["status"] != "ok":
+            discard_output(result["output"])
+
+        return item
+
+class PreviewRenderer(object):
+    # vectorizes crops of a low-resolution copy of an img on a background thread, abandoning renders superseded by newer requests
+    def __init__(self, img_path, processor, callback, source_size=1600):
+        self.img_path = img_path
+        self.processor = processor
+        self.callback = callback # called on worker thread with (crop_bounds, rotate, contours, processed img shape) of each finished render, holes included as separate contours
+        self.source_size = source_size # longest side img is decoded at, once, for all crops
+        self.condition = threading.Condition()
+        self.request = None
+        self.generation = 0
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, crop_bounds, rotate=False): # replaces any pending request, cancelling render in progress
+        with self.condition:
+            self.generation += 1
+            self.request = (self.generation, crop_bounds, rotate)
+            self.condition.notify()
+
+    def run(self):
+        src_img = None
+        while True:
+            with self.condition:
+                while self.request is None:
+                    self.condition.wait()
+                generation, crop_bounds, rotate = self.request
+                self.request = None
+
+            try:
+                if src_img is None:
+                    src_img = load_np_image(self.img_path, target_size=self.source_size)
+                rendered = self.render(src_img, generation, crop_bounds, rotate)
+            except Exception as e:
+                print(" * Preview failed - "+type(e).__name__+": "+str(e))
+                continue
 
+            if rendered is not None:
+                contours, img_shape = rendered
+                self.callback(crop_bounds, rotate, contours, img_shape)
+
+    def render(self, src_img, generation, crop_bounds, rotate): # returns (contours, processed img shape), None if superseded midway
+        if rotate:
+            src_img = src_img[:, ::-1, ::-1]
+        rows, cols = get_crop_slices(src_img.shape[1:], crop_bounds)
+        img = self.processor.process_numpy_img(src_img[:, rows, cols])
+
+        # newer requests are checked for between clusters, as tracing dominates render time
+        contours = []
+        for contour in self.processor.iter_clusters(img):
+            if generation != self.generation:
+                return None
+            contours.append(contour)
+            contours.extend(contour.holes)
+
+        return contours, img.shape[1:]
+
+def new_batch_result(input_path, output_path, status="ok"): # returns result of batch item, every summary entry has this schema
+    return {"input": input_path, "output": output_path, "status": status, "error": None, "seconds": 0.0, "stat": None, "hash": None, "stats": None, "profile": None}
+
+def discard_output(output_path): # removes partially written output of failed batch item, if any
+    if os.path.exists(output_path):
+        os.remove(output_path)
+
+def process_batch_chunk(batch_items):
+    return [process_batch_item(batch_item) for batch_item in batch_items]
+
+def process_batch_item_isolated(batch_item, mp_context=None): # processes one batch file in a process of its own, recording it as failed if that process dies
+    processor, input_path, output_path, timeout = batch_item
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context=mp_context) as executor:
+        try:
+            return executor.submit(process_batch_item, batch_item).result()
+        except concurrent.futures.BrokenExecutor:
+            result = new_batch_result(input_path, output_path, status="failed")
+            result["error"] = "worker process died"
+
+    discard_output(output_path)
+    return result
+
+def process_batch_item(batch_item): # processes one batch file, recording failures instead of raising
+    processor, input_path, output_path, timeout = batch_item
+    result = new_batch_result(input_path, output_path)
+
+    start_time = time.time()
+    try:
+        # stat & hash for batch manifest are taken before decoding, so a file changing midway is reprocessed by later incremental runs
+        result["stat"] = os.stat(input_path)
+        result["hash"] = hash_file(input_path)
+
+        with time_limit(timeout):
+            result["stats"] = processor.process_img_at_path(input_path, output_path, include_inputs=False, file_hash=result["hash"])
+        if processor.profile:
+            result["profile"] = processor.profiler.get_report(input_path)
+    except BatchTimeoutError:
+        result["status"] = "timeout"
+        result["error"] = "exceeded "+str(timeout)+"s"
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = type(e).__name__+": "+str(e)
+    result["seconds"] = time.time() - start_time
+
+    if result["status"] != "ok":
+        discard_output(output_path)
+
+    return result
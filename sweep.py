@@ -0,0 +1,144 @@
+import os
+import csv
+import time
+import argparse
+import itertools
+from processors import *
+
+# params each stage depends on, on top of those of stages before it
+SWEEP_STAGES = [
+    ("decode", ["draft_decode", "crop_bounds", "rotate"]),
+    ("rescale", ["target_size", "resize"]),
+    ("preprocess", ["threshold", "coeff", "compact"]),
+    ("trace", ["min_dist_threshold", "close_trace_threshold", "labeling", "tracer", "holes", "min_area", "min_bbox", "simplify_tolerance", "curve_tolerance"]),
+    ("write", ["stroke_width", "color", "compress_output"]),
+]
+
+def get_stage_keys(params): # returns key of each stage, covering params of stage & all stages before it
+    stage_keys = []
+    stage_params = {}
+    for stage, names in SWEEP_STAGES:
+        for name in names:
+            stage_params[name] = params[name]
+
+        # draft decodes are sized by target_size, tracing only depends on which of simplification or curve fitting is set, not their tolerances
+        key_params = dict(stage_params)
+        if stage == "decode" and params["draft_decode"]:
+            key_params["target_size"] = params["target_size"]
+        if stage == "trace":
+            key_params["simplify_tolerance"] = params["simplify_tolerance"] is not None
+            key_params["curve_tolerance"] = params["curve_tolerance"] is not None
+        if stage == "write":
+            key_params["simplify_tolerance"] = params["simplify_tolerance"]
+            key_params["curve_tolerance"] = params["curve_tolerance"]
+        stage_keys.append(json.dumps(key_params, sort_keys=True))
+    return stage_keys
+
+def get_combination_name(combination):
+    return "_".join([name+"="+str(value) for name, value in combination])
+
+def run_stage(memo, stage, key, fn, *args): # returns (result, seconds spent), result reused if stage already ran with same key
+    if stage in memo and memo[stage][0] == key:
+        return memo[stage][1], 0.0
+
+    start_time = time.perf_counter()
+    result = fn(*args)
+    seconds = time.perf_counter() - start_time
+    memo[stage] = (key, result)
+
+    # results of later stages were computed from an earlier result of this one
+    stage_names = [name for name, names in SWEEP_STAGES]
+    for later_stage in stage_names[stage_names.index(stage)+1:]:
+        memo.pop(later_stage, None)
+
+    return result, seconds
+
+def sweep(img_paths, grid, output_path="sweep", base_params=None): # vectorizes each img with every combination of grid values, returns table rows
+    # combinations are ordered so those sharing upstream params run consecutively, each stage then runs once per distinct upstream params
+    names = sorted(grid.keys())
+    combinations = []
+    for values in itertools.product(*[grid[name] for name in names]):
+        combination = list(zip(names, values))
+        processor = PictureVectorizer(**dict(list((base_params or {}).items()) + combination))
+        if processor.tile_size is not None or processor.cache_dir is not None:
+            raise ValueError("sweeps don't support tiled processing or result caching")
+        combinations.append((get_stage_keys(processor.get_params()), combination, processor))
+    combinations.sort(key=lambda combination: combination[0])
+
+    prepare_path(output_path)
+    rows = []
+    for img_path in img_paths:
+        img_name = os.path.splitext(os.path.basename(img_path))[0]
+        memo = {}
+        for stage_keys, combination, processor in combinations:
+            output_filename = img_name+"_"+get_combination_name(combination)+(".svgz" if processor.compress_output else ".svg")
+
+            img, decode_time = run_stage(memo, "decode", stage_keys[0], processor.load_img, img_path)
+            img, rescale_time = run_stage(memo, "rescale", stage_keys[1], processor.rescale_to_target, img)
+            img, preprocess_time = run_stage(memo, "preprocess", stage_keys[2], processor.process_rescaled_img, img)
+            clusters, trace_time = run_stage(memo, "trace", stage_keys[3], processor.find_clusters, img)
+
+            start_time = time.perf_counter()
+            stats = processor.write_clusters_to_path(iter(clusters), img.shape[2], img.shape[1], os.path.join(output_path, output_filename))
+            write_time = time.perf_counter() - start_time
+
+            row = {"img": img_name}
+            row.update(dict(combination))
+            row.update({
+                "seconds": decode_time + rescale_time + preprocess_time + trace_time + write_time,
+                "decode": decode_time,
+                "rescale": rescale_time,
+                "preprocess": preprocess_time,
+                "trace": trace_time,
+                "write": write_time,
+                "points_traced": stats["points_traced"],
+                "paths": stats["paths"],
+                "commands": stats["commands"],
+                "bytes": stats["bytes"],
+                "output": output_filename,
+            })
+            rows.append(row)
+
+    return rows
+
+def format_table(rows, columns):
+    cells = [columns] + [[("%.3f" % row[column]) if isinstance(row[column], float) else str(row[column]) for column in columns] for row in rows]
+    widths = [max([len(row_cells[i]) for row_cells in cells]) for i in range(len(columns))]
+    return "\n".join(["  ".join([cell.rjust(width) for cell, width in zip(row_cells, widths)]) for row_cells in cells])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+", help="images or directories of images to sweep over")
+    parser.add_argument("--threshold", type=float, nargs="+", default=[0.835])
+    parser.add_argument("--coeff", type=float, nargs="+", default=[10.0])
+    parser.add_argument("--min-dist", type=float, nargs="+", default=[3.2], help="values of min_dist_threshold")
+    parser.add_argument("--close-trace", type=float, nargs="+", default=[2.1], help="values of close_trace_threshold")
+    parser.add_argument("--target-size", type=int, nargs="+", default=[1200])
+    parser.add_argument("--output", default="sweep", help="directory for svgs & table")
+    args = parser.parse_args()
+
+    img_paths = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            img_paths += sorted([entry.path for entry in os.scandir(path) if entry.is_file() and (".jpg" in entry.name.lower() or ".jpeg" in entry.name.lower() or ".png" in entry.name.lower())])
+        else:
+            img_paths.append(path)
+
+    grid = {
+        "threshold": args.threshold,
+        "coeff": args.coeff,
+        "min_dist_threshold": args.min_dist,
+        "close_trace_threshold": args.close_trace,
+        "target_size": args.target_size,
+    }
+    rows = sweep(img_paths, grid, output_path=args.output, base_params={"stroke_width": 0.5, "color": '#000'})
+
+    columns = ["img"] + sorted(grid.keys()) + ["seconds", "decode", "rescale", "preprocess", "trace", "write", "points_traced", "paths", "commands", "bytes"]
+    print(format_table(rows, columns))
+
+    table_path = os.path.join(args.output, "sweep.csv")
+    with open(table_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns + ["output"])
+        writer.writeheader()
+        writer.writerows(rows)
+    print(" * Wrote "+str(len(rows))+" svgs & table to "+table_path)
@@ -1,12 +1,39 @@
-import sys
+import argparse
 from processors import *
 
 if __name__ == "__main__":
-    processor = PictureVectorizer(threshold=0.835, coeff=10.0, target_size=1200, stroke_width=0.5, color='#000', min_dist_threshold=3.2, close_trace_threshold=2.1)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", help="image file or directory of images to vectorize")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes for batch runs")
+    parser.add_argument("--chunk-size", type=int, default=1, help="files handed to a worker at a time")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds allowed per file before it is skipped")
+    parser.add_argument("--tile-size", type=int, default=None, help="process very large scans in tiles of this many pixels, uncompressed tiff, bmp & ppm scans are also decoded in strips")
+    parser.add_argument("--cache-dir", default=None, help="directory for cached results, reused across runs")
+    parser.add_argument("--incremental", action="store_true", help="keep existing batch outputs, only processing new or changed files")
+    parser.add_argument("--simplify", type=float, default=None, help="simplify contours to within this many pixels instead of min-distance decimation")
+    parser.add_argument("--curves", type=float, default=None, help="fit cubic bezier curves to contours within this many pixels")
+    parser.add_argument("--profile", action="store_true", help="write a json report of time & memory spent per stage")
+    parser.add_argument("--profile-memory", action="store_true", help="also record peak memory allocated per stage (slower)")
+    parser.add_argument("--holes", default="evenodd", choices=["evenodd", "overlay"], help="cut holes out of enclosing paths, or draw them as white paths on top")
+    parser.add_argument("--draft", action="store_true", help="decode jpegs at reduced scale close to target size, for faster loading of large photos")
+    parser.add_argument("--pipeline", action="store_true", help="overlap reading, computing & writing of batch files in threads")
+    parser.add_argument("--read-threads", type=int, default=2, help="threads reading & decoding files ahead in pipelined batches")
+    parser.add_argument("--compute-threads", type=int, default=1, help="threads vectorizing decoded files in pipelined batches")
+    parser.add_argument("--write-threads", type=int, default=1, help="threads writing finished files in pipelined batches")
+    parser.add_argument("--queue-size", type=int, default=4, help="files held between pipeline stages at most")
+    parser.add_argument("--min-area", type=int, default=0, help="skip specks & enclosed white regions of fewer pixels before tracing")
+    parser.add_argument("--min-bbox", type=int, default=0, help="skip specks & enclosed white regions whose bbox is shorter than this many pixels before tracing")
+    parser.add_argument("--svgz", action="store_true", help="write gzip-compressed .svgz output")
+    args = parser.parse_args()
 
-    if "." in sys.argv[1]:
-        processor.process_img_at_path(sys.argv[1], output_path='test_out.svg')
-        preview_np_image(load_np_image(sys.argv[1]), "test_in.png")
+    processor = PictureVectorizer(threshold=0.835, coeff=10.0, target_size=1200, stroke_width=0.5, color='#000', min_dist_threshold=3.2, close_trace_threshold=2.1, compress_output=args.svgz, tile_size=args.tile_size, cache_dir=args.cache_dir, simplify_tolerance=args.simplify, curve_tolerance=args.curves, profile=args.profile, profile_memory=args.profile_memory, holes=args.holes, draft_decode=args.draft, min_area=args.min_area, min_bbox=args.min_bbox)
+
+    if "." in args.path:
+        stats = processor.process_img_at_path(args.path, output_path='test_out.svgz' if args.svgz else 'test_out.svg')
+        if stats is not None:
+            print(" * "+format_stats(stats))
+        if args.tile_size is None: # full-frame preview would defeat tiling, tiled runs already write their bitmap preview next to output
+            preview_np_image(load_np_image(args.path), "test_in.png")
     else:
-        new_path = sys.argv[1].strip("/")+"_vectorized"
-        processor.process_batch(sys.argv[1], output_path=new_path)
+        new_path = args.path.strip("/")+"_vectorized"
+        processor.process_batch(args.path, output_path=new_path, workers=args.workers, chunk_size=args.chunk_size, timeout=args.timeout, incremental=args.incremental, pipeline=args.pipeline, read_threads=args.read_threads, compute_threads=args.compute_threads, write_threads=args.write_threads, queue_size=args.queue_size)
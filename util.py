@@ -1,23 +1,574 @@
 import os
 import shutil
+import signal
+import threading
+import multiprocessing
+import contextlib
+import gzip
+import hashlib
+import io
+import json
+import tempfile
+import time
+import tracemalloc
 import numpy as np
+import scipy.ndimage
 import skimage.transform
 from PIL import Image as pilImage
 
 
+# pixel states shared by cluster exploration & tracing, stored one byte per pixel
+PIXEL_UNVISITED = 0
+PIXEL_ACTIVE = 1
+PIXEL_VISITED = 2
+PIXEL_SKIPPED = 3 # visited, but part of a skipped speck
+
+def new_pixel_mask(img):
+    return np.zeros(img.shape[1:], dtype=np.uint8)
+
+def pad_bbox(bbox, shape, margin=1):
+    # grows (x_min, x_max, y_min, y_max) bbox by margin, clipped to image bounds
+    return (max(bbox[0]-margin, 0), min(bbox[1]+margin, shape[0]), max(bbox[2]-margin, 0), min(bbox[3]+margin, shape[1]))
+
+class ScratchBufferPool(object):
+    # hands out reusable scratch arrays, reallocating only when a larger one is requested
+    def __init__(self):
+        self.buffers = {}
+
+    def get(self, name, shape, dtype, fill_value):
+        size = int(np.prod(shape))
+        key = (name, np.dtype(dtype).str)
+        buffer = self.buffers.get(key)
+        if buffer is None or buffer.size < size:
+            buffer = np.empty(size, dtype=dtype)
+            self.buffers[key] = buffer
+
+        # view is only valid until the next get() with same name
+        view = buffer[:size].reshape(shape)
+        view.fill(fill_value)
+        return view
+
+class BatchTimeoutError(Exception):
+    pass
+
+@contextlib.contextmanager
+def time_limit(seconds):
+    # raises BatchTimeoutError if block runs longer than seconds, only enforceable on main thread where SIGALRM is available
+    if seconds is None or not hasattr(signal, "SIGALRM") or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def on_alarm(signum, frame):
+        raise BatchTimeoutError()
+
+    previous_handler = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+class SVGWriter(object):
+    # streams svg document to a buffered (optionally gzip-compressed) file, one path at a time
+    def __init__(self, path, width, height, compress=False, buffer_size=1<<16): # path may also be a binary file object, left open on close
+        self.owns_file = isinstance(path, str)
+        self.path = path if self.owns_file else None
+        self.raw_file = open(path, 'wb', buffering=buffer_size) if self.owns_file else path
+        if compress:
+            self.compressed_file = gzip.GzipFile(filename="", mode='wb', fileobj=self.raw_file, mtime=0)
+            self.file = io.TextIOWrapper(self.compressed_file, encoding='utf-8', newline='')
+        else:
+            self.compressed_file = None
+            self.file = io.TextIOWrapper(self.raw_file, encoding='utf-8', newline='')
+
+        self.file.write("<?xml version='1.0' encoding='UTF-8' standalone='no'?>\n<!DOCTYPE svg PUBLIC '-//W3C//DTD SVG 1.1//EN' 'http://www.w3.org/Graphics/SVG/1.1/DTD/svg11.dtd'>\n")
+        self.file.write("<svg width='"+str(width)+"' height='"+str(height)+"' viewBox='0.0 0.0 "+str(width)+" "+str(height)+"' xmlns='http://www.w3.org/2000/svg' xmlns:xlink='http://www.w3.org/1999/xlink'>\n")
+        self.file.write("<rect fill='none' stroke='#000' x='0' y='0' width='"+str(width)+"' height='"+str(height)+"'/>\n")
+        self.file.write("<g>\n")
+
+    def write_path(self, path_data, fill, stroke_width, stroke, fill_rule=None):
+        self.file.write("<path d='"+path_data+"' fill='"+fill+"'"+(" fill-rule='"+fill_rule+"'" if fill_rule is not None else "")+" stroke-width='"+str(stroke_width)+"' stroke='"+stroke+"'/>\n")
+
+    def close(self):
+        self.file.write("</g>\n</svg>")
+        self.close_files()
+
+    def abort(self): # closes without svg footer, deleting file if opened by writer, so a failed write never leaves a truncated svg that looks complete
+        try:
+            self.close_files()
+        finally:
+            if self.owns_file and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def close_files(self):
+        self.file.detach()
+        if self.compressed_file is not None:
+            self.compressed_file.close() # gzip doesn't close file objects it was handed
+        if self.owns_file:
+            self.raw_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def get_threaded_mp_context(): # context for starting worker processes from a process with live threads, which forking could deadlock
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["processors"]) # rather than __main__, whose ui module-level code shouldn't run in workers
+        return context
+    return multiprocessing.get_context("spawn")
+
+def hash_file(path, chunk_size=1<<20):
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+class ResultCache(object):
+    # on-disk cache of svg outputs & preprocessed bitmaps, keyed by input contents and params, evicted least recently used first
+    def __init__(self, cache_dir, size_limit=1<<30):
+        self.cache_dir = cache_dir
+        self.size_limit = size_limit
+        self.total_size = None # bytes in cache when last scanned plus bytes stored since, None until first scan (misses other processes' stores until next scan)
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, path, params, file_hash=None): # file_hash can be given if already known
+        key_hash = hashlib.sha256()
+        key_hash.update((file_hash if file_hash is not None else hash_file(path)).encode('utf-8'))
+        key_hash.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+        return key_hash.hexdigest()
+
+    def get_entry_path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def fetch(self, key, output_path, preview_path=None): # copies cached output to output_path, returns False on miss
+        entry_path = self.get_entry_path(key)
+        try:
+            shutil.copyfile(os.path.join(entry_path, "output"), output_path)
+            if preview_path is not None:
+                bitmap = self.load_bitmap(key)
+                preview_np_image(np.expand_dims(bitmap, axis=0), preview_path)
+            os.utime(entry_path) # marks as recently used
+        except OSError:
+            return False # missing, or evicted by another process while reading
+        return True
+
+    def load_bitmap(self, key): # returns cached 2D bool bitmap (True = white)
+        with np.load(os.path.join(self.get_entry_path(key), "bitmap.npz")) as data:
+            shape = tuple(data["shape"])
+            return np.unpackbits(data["bits"], count=int(np.prod(shape))).reshape(shape).astype(bool)
+
+    def store(self, key, output_path, bitmap): # caching is best effort, failing to store an entry never fails the output it caches
+        entry_path = self.get_entry_path(key)
+        if os.path.exists(entry_path):
+            return
+
+        # writes entry to temporary dir first so partially written entries are never visible
+        temp_path = None
+        try:
+            temp_path = tempfile.mkdtemp(prefix=".tmp_", dir=self.cache_dir)
+            shutil.copyfile(output_path, os.path.join(temp_path, "output"))
+            np.savez(os.path.join(temp_path, "bitmap.npz"), bits=np.packbits(np.asarray(bitmap)), shape=np.array(bitmap.shape))
+            entry_size = sum([f.stat().st_size for f in os.scandir(temp_path)])
+            try:
+                os.rename(temp_path, entry_path)
+            except OSError:
+                shutil.rmtree(temp_path, ignore_errors=True) # stored concurrently by another process
+                return
+
+            # whole cache is only rescanned once running total passes limit, not on every store
+            if self.total_size is None or self.total_size + entry_size > self.size_limit:
+                self.evict()
+            else:
+                self.total_size += entry_size
+        except OSError as e:
+            print(" * Failed to cache "+os.path.basename(output_path)+" - "+type(e).__name__+": "+str(e))
+            if temp_path is not None:
+                shutil.rmtree(temp_path, ignore_errors=True)
+
+    def evict(self): # removes least recently used entries until under 90% of size limit, so evictions (& their scans) are rare once cache is full
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self.cache_dir):
+            try:
+                if not entry.is_dir() or entry.name.startswith(".tmp_"):
+                    continue
+                entry_size = sum([f.stat().st_size for f in os.scandir(entry.path)])
+                entries.append((entry.stat().st_mtime, entry_size, entry.path))
+                total_size += entry_size
+            except OSError:
+                continue # evicted by another process while scanning
+
+        # leaves headroom below limit only when evicting, a cache under limit is kept whole
+        entries.sort()
+        target_size = self.size_limit if total_size <= self.size_limit else int(0.9 * self.size_limit)
+        for mtime, entry_size, entry_path in entries:
+            if total_size <= target_size:
+                break
+            shutil.rmtree(entry_path, ignore_errors=True)
+            total_size -= entry_size
+        self.total_size = total_size
+
+def start_pipeline_stage(stage_fns, in_queue, out_queue, num_consumers=1): # runs one thread per fn, each passing items from in_queue through fn to out_queue until it gets None
+    def run_stage(stage_fn):
+        while True:
+            item = in_queue.get()
+            if item is None:
+                break
+            out_queue.put(stage_fn(item))
+
+    # once every thread is done, tells each thread of next stage to stop
+    def finish_stage(threads):
+        for thread in threads:
+            thread.join()
+        for i in range(num_consumers):
+            out_queue.put(None)
+
+    threads = [threading.Thread(target=run_stage, args=(stage_fn,), daemon=True) for stage_fn in stage_fns]
+    for thread in threads:
+        thread.start()
+    threading.Thread(target=finish_stage, args=(threads,), daemon=True).start()
+
+class BatchManifest(object):
+    # append-only log of finished batch outputs and the input & params they were made from, later records override earlier ones
+    def __init__(self, path, load_existing=True):
+        self.path = path
+        self.records = {}
+        if load_existing and os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue # partially written line from interrupted run
+                    self.records[record["input"]] = record
+        self.file = open(self.path, 'a' if load_existing else 'w')
+
+    def is_up_to_date(self, entry, params, output_filename, output_path):
+        record = self.records.get(entry.name)
+        if record is None or record["params"] != params or record["output"] != output_filename or not os.path.exists(os.path.join(output_path, output_filename)):
+            return False
+
+        stat = entry.stat()
+        if record["mtime"] == stat.st_mtime and record["size"] == stat.st_size:
+            return True
+
+        # touched but unchanged files are only hashed when mtime or size differ
+        if record["size"] == stat.st_size and record["hash"] == hash_file(entry.path):
+            self.record(entry.name, stat, record["hash"], params, output_filename)
+            return True
+        return False
+
+    def record(self, input_name, stat, file_hash, params, output_filename):
+        record = {"input": input_name, "mtime": stat.st_mtime, "size": stat.st_size, "hash": file_hash, "params": params, "output": output_filename}
+        self.records[input_name] = record
+        self.file.write(json.dumps(record, sort_keys=True)+"\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class NullProfiler(object):
+    # stand-in when profiling is disabled, every call is a no-op
+    def __init__(self):
+        self.null_stage = contextlib.nullcontext()
+
+    def stage(self, name):
+        return self.null_stage
+
+    def count(self, name, value=1):
+        pass
+
+    def reset(self):
+        pass
+
+    def get_report(self, path=None):
+        return None
+
+class StageProfiler(object):
+    # records wall time, calls & peak allocation of named (possibly nested) stages, plus named counters
+    def __init__(self, track_memory=True):
+        self.track_memory = track_memory
+        self.reset()
+
+    def reset(self):
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.stages = {}
+        self.counters = {}
+        self.stack = []
+        self.start_time = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        frame = {"name": name, "start_time": time.perf_counter(), "start_memory": 0, "peak_memory": 0}
+        if self.track_memory:
+
+            # peak is reset per stage, so the enclosing stage keeps track of peak seen so far
+            current_memory, peak_memory = tracemalloc.get_traced_memory()
+            if len(self.stack) > 0:
+                self.stack[-1]["peak_memory"] = max(self.stack[-1]["peak_memory"], peak_memory)
+            tracemalloc.reset_peak()
+            frame["start_memory"] = current_memory
+            frame["peak_memory"] = current_memory
+        self.stack.append(frame)
+
+        try:
+            yield
+        finally:
+            self.stack.pop()
+            stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "peak_bytes": 0})
+            stage["seconds"] += time.perf_counter() - frame["start_time"]
+            stage["calls"] += 1
+            if self.track_memory:
+                peak_memory = max(frame["peak_memory"], tracemalloc.get_traced_memory()[1])
+                stage["peak_bytes"] = max(stage["peak_bytes"], peak_memory - frame["start_memory"])
+                if len(self.stack) > 0:
+                    self.stack[-1]["peak_memory"] = max(self.stack[-1]["peak_memory"], peak_memory)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def get_report(self, path=None):
+        return {"input": path, "seconds": time.perf_counter() - self.start_time, "stages": self.stages, "counters": self.counters}
+
+def aggregate_profile_reports(reports): # sums times, calls & counters over reports, keeping max of peak allocations
+    aggregate = {"images": len(reports), "seconds": 0.0, "stages": {}, "counters": {}}
+    for report in reports:
+        aggregate["seconds"] += report["seconds"]
+        for name, stage in report["stages"].items():
+            aggregate_stage = aggregate["stages"].setdefault(name, {"seconds": 0.0, "calls": 0, "peak_bytes": 0})
+            aggregate_stage["seconds"] += stage["seconds"]
+            aggregate_stage["calls"] += stage["calls"]
+            aggregate_stage["peak_bytes"] = max(aggregate_stage["peak_bytes"], stage["peak_bytes"])
+        for name, value in report["counters"].items():
+            aggregate["counters"][name] = aggregate["counters"].get(name, 0) + value
+    return aggregate
+
+def write_json(data, path):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+def get_profile_path(output_path):
+    return os.path.splitext(output_path)[0]+"_profile.json"
+
+def get_preview_path(output_path):
+    return os.path.splitext(output_path.replace("_out", ""))[0]+"_in_processed.png"
+
 def prepare_path(path):
     if os.path.exists(path):
         shutil.rmtree(path)
     os.mkdir(path)
 
-def load_np_image(path):
+def load_np_image(path, target_size=None, crop_bounds=None, rotate=False): # if target_size given, decoders supporting it (e.g. jpeg) decode at reduced scale, no smaller than target_size after cropping
+    return to_float_np_image(decode_np_image(path, target_size=target_size, crop_bounds=crop_bounds, rotate=rotate))
+
+def decode_np_image(path, target_size=None, crop_bounds=None, rotate=False): # returns 8-bit (height, width, channels) img, cropped & rotated, 1/8 the size of its float version
     img = pilImage.open(path)
-    np_img = np.array(img).astype(float) / 256.0
+    if target_size is not None:
+
+        # longest side of cropped region, x bounds span img width & y bounds its height
+        cropped_size = img.size
+        if crop_bounds is not None:
+            cropped_size = ((crop_bounds[1] - crop_bounds[0]) * img.size[0], (crop_bounds[3] - crop_bounds[2]) * img.size[1])
+        ratio = target_size / max(cropped_size[0], cropped_size[1], 1.0)
+        if ratio < 1.0:
+            img.draft(img.mode, (int(np.ceil(img.size[0] * ratio)), int(np.ceil(img.size[1] * ratio))))
+    np_img = np.asarray(img)
+
+    # crops & rotates 8-bit img before converting to float, so discarded pixels are never converted
+    if rotate:
+        np_img = np_img[::-1, ::-1]
+    if crop_bounds is not None:
+        rows, cols = get_crop_slices(np_img.shape[:2], crop_bounds)
+        np_img = np_img[rows, cols]
+
+    return np_img
+
+def to_float_np_image(np_img): # converts decoded 8-bit img to (channels, height, width) float img
+    np_img = np_img.astype(float) / 256.0
     np_img = np.transpose(np_img, [2, 0, 1])
 
     return np_img
 
+def probe_image_size(path): # returns (width, height) of img from its header, without decoding pixels
+    with pilImage.open(path) as img:
+        return img.size
+
+def get_proxy_image_path(path, display_size, cache_dir=None): # returns path of cached copy of img downsampled by a power of two to no smaller than display_size, or path itself if already small enough
+    img_size = probe_image_size(path)
+    level = 0
+    while max(img_size) >> (level+1) >= max(display_size):
+        level += 1
+    if level == 0:
+        return path
+
+    # proxies are keyed by source path & modification, one file per pyramid level
+    if cache_dir is None:
+        cache_dir = os.path.join(tempfile.gettempdir(), "vectorizer_proxies")
+    os.makedirs(cache_dir, exist_ok=True)
+    stat = os.stat(path)
+    key = hashlib.sha256((os.path.abspath(path)+"|"+str(stat.st_mtime)+"|"+str(stat.st_size)).encode('utf-8')).hexdigest()
+    proxy_path = os.path.join(cache_dir, key+"_"+str(level)+".png")
+    if os.path.exists(proxy_path):
+        return proxy_path
+
+    # jpegs decode straight at power of two scales, remaining reduction is box-averaged
+    proxy_size = (max(img_size[0] >> level, 1), max(img_size[1] >> level, 1))
+    with pilImage.open(path) as img:
+        img.draft(img.mode, proxy_size)
+        proxy = img.resize(proxy_size, pilImage.BOX)
+
+    # written to temporary file first so partially written proxies are never used
+    temp_path = proxy_path+".tmp"+str(os.getpid())
+    proxy.save(temp_path, format="PNG", compress_level=1)
+    os.replace(temp_path, proxy_path)
+    return proxy_path
+
+def get_crop_slices(shape, crop_bounds): # returns (rows, cols) slices of (H, W) img for normalized (x_min, x_max, y_min, y_max) crop bounds, y measured from bottom
+    x_min, x_max, y_min, y_max = crop_bounds
+    x_min_ind = min(int((x_min*shape[1])+0.5), shape[1]-1)
+    x_max_ind = min(max(int((x_max*shape[1])+0.5), x_min_ind+1), shape[1]-1)
+    y_min_ind = min(int((y_min*shape[0])+0.5), shape[0]-1)
+    y_max_ind = min(max(int((y_max*shape[0])+0.5), y_min_ind+1), shape[0]-1)
+    return slice(shape[0]-1-y_max_ind, shape[0]-1-y_min_ind), slice(x_min_ind, x_max_ind)
+
+def load_np_image_memmap(path, mmap_path, strip_size=256): # returns (H, W, 3) uint8 img backed by file at mmap_path
+    if path.lower().endswith(".npy"):
+        return np.load(path, mmap_mode='r')
+
+    # huge scans are expected here, so PIL's decompression bomb limit (~179 MP) is lifted
+    max_image_pixels = pilImage.MAX_IMAGE_PIXELS
+    pilImage.MAX_IMAGE_PIXELS = None
+    try:
+        img = pilImage.open(path)
+    finally:
+        pilImage.MAX_IMAGE_PIXELS = max_image_pixels
+    np_img = np.lib.format.open_memmap(mmap_path, mode='w+', dtype=np.uint8, shape=(img.size[1], img.size[0], 3))
+
+    # copies decoded img to disk strip by strip, never holding a full-frame numpy copy
+    strides = get_raw_tile_strides(img)
+    if strides is not None:
+        copy_raw_image_strips(img, path, strides, np_img, strip_size=strip_size)
+    else:
+        # compressed encodings (e.g. png, jpeg) can only be decoded whole by PIL, so peak memory includes one full frame
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        for x in range(0, img.size[1], strip_size):
+            np_img[x:x+strip_size] = np.asarray(img.crop((0, x, img.size[0], min(x+strip_size, img.size[1]))))
+    img.close()
+    np_img.flush()
+
+    return np_img
+
+def get_raw_tile_strides(img): # returns bytes per row of each tile of uncompressed img (e.g. tiff, bmp, ppm), None if it can't be decoded in strips
+    if img.mode not in ("1", "L", "RGB", "RGBA", "RGBX", "CMYK"):
+        return None
+
+    strides = []
+    for codec_name, extents, offset, args in img.tile:
+        if codec_name != "raw" or extents[2] > img.size[0] or extents[3] > img.size[1]:
+            return None
+        rawmode, stride, orientation = (((args,) if isinstance(args, str) else tuple(args)) + (0, 1))[:3]
+        if stride == 0:
+            try:
+                stride = len(pilImage.new(img.mode, (extents[2]-extents[0], 1)).tobytes("raw", rawmode))
+            except (ValueError, OSError):
+                return None # raw mode without a packer, row size unknown
+        strides.append(stride)
+
+    return strides
+
+def copy_raw_image_strips(img, path, strides, np_img, strip_size=256): # decodes uncompressed img tile by tile, strip_size rows at a time, into (H, W, 3) uint8 np_img
+    with open(path, 'rb') as f:
+        for (codec_name, extents, offset, args), stride in zip(img.tile, strides):
+            rawmode, unused_stride, orientation = (((args,) if isinstance(args, str) else tuple(args)) + (0, 1))[:3]
+            x_min, y_min, x_max, y_max = extents
+            tile_height = y_max - y_min
+
+            for row in range(0, tile_height, strip_size):
+                num_rows = min(strip_size, tile_height - row)
+
+                # bottom-up tiles (negative orientation) store their last row first
+                stored_row = row if orientation >= 0 else tile_height - row - num_rows
+                f.seek(offset + (stored_row * stride))
+                strip = pilImage.frombytes(img.mode, (x_max-x_min, num_rows), f.read(num_rows * stride), "raw", rawmode, stride, orientation)
+                np_img[y_min+row:y_min+row+num_rows, x_min:x_max] = np.asarray(strip.convert("RGB"))
+
+def resample_gray_region(src_img, out_shape, rows, cols): # returns rows & cols of (H, W, 3) uint8 src_img rescaled to out_shape & averaged to gray, anti-aliased like rescale
+    scale = (src_img.shape[0] / out_shape[0], src_img.shape[1] / out_shape[1])
+    sigma = (max(0.0, (scale[0]-1.0) / 2.0), max(0.0, (scale[1]-1.0) / 2.0))
+
+    # output pixel centers in source coords
+    coords_x = (np.arange(rows[0], rows[1]) + 0.5) * scale[0] - 0.5
+    coords_y = (np.arange(cols[0], cols[1]) + 0.5) * scale[1] - 0.5
+
+    # reads only source region covering output region plus filter margin
+    margin = (int(4.0 * sigma[0] + 0.5) + 2, int(4.0 * sigma[1] + 0.5) + 2)
+    x_min = max(int(np.floor(coords_x[0])) - margin[0], 0)
+    x_max = min(int(np.ceil(coords_x[-1])) + margin[0] + 1, src_img.shape[0])
+    y_min = max(int(np.floor(coords_y[0])) - margin[1], 0)
+    y_max = min(int(np.ceil(coords_y[-1])) + margin[1] + 1, src_img.shape[1])
+    region = np.mean(np.asarray(src_img[x_min:x_max, y_min:y_max]), axis=-1) / 256.0
+
+    if sigma[0] > 0.0 or sigma[1] > 0.0:
+        region = scipy.ndimage.gaussian_filter(region, sigma, mode='mirror')
+
+    grid_x, grid_y = np.meshgrid(np.clip(coords_x, 0, src_img.shape[0]-1) - x_min, np.clip(coords_y, 0, src_img.shape[1]-1) - y_min, indexing='ij')
+    return scipy.ndimage.map_coordinates(region, [grid_x, grid_y], order=1, mode='nearest')
+
+def iter_tiles(shape, tile_size): # yields ((x_min, x_max), (y_min, y_max)) of tiles covering 2D shape in raster order
+    for x in range(0, shape[0], tile_size):
+        for y in range(0, shape[1], tile_size):
+            yield (x, min(x+tile_size, shape[0])), (y, min(y+tile_size, shape[1]))
+
+class UnionFind(object):
+    # disjoint sets over integer labels, used to stitch labels across tile seams
+    def __init__(self, size):
+        self.parents = np.arange(size)
+
+    def find(self, label):
+        while self.parents[label] != label:
+            self.parents[label] = self.parents[self.parents[label]]
+            label = self.parents[label]
+        return label
+
+    def union(self, label_a, label_b):
+        root_a = self.find(label_a)
+        root_b = self.find(label_b)
+        if root_a != root_b:
+            self.parents[max(root_a, root_b)] = min(root_a, root_b)
+
+    def union_adjacent_lines(self, labels_a, labels_b):
+        # unions labels of 8-connected pixels on two adjacent lines of pixels, 0 being unlabeled
+        labels_a = np.asarray(labels_a)
+        labels_b = np.asarray(labels_b)
+        pairs = [np.stack((labels_a, labels_b), axis=-1), np.stack((labels_a[1:], labels_b[:-1]), axis=-1), np.stack((labels_a[:-1], labels_b[1:]), axis=-1)]
+        pairs = np.concatenate(pairs, axis=0)
+        pairs = np.unique(pairs[np.logical_and(pairs[:, 0] > 0, pairs[:, 1] > 0)], axis=0)
+        for label_a, label_b in pairs:
+            self.union(label_a, label_b)
+
+    def roots(self):
+        # resolves every label to its root
+        roots = self.parents.copy()
+        while True:
+            next_roots = roots[roots]
+            if np.array_equal(next_roots, roots):
+                return roots
+            roots = next_roots
+
 def preview_np_image(np_img, path):
+    if np_img.shape[0] == 1: # single-channel imgs are expanded to rgb for previews only
+        np_img = np.tile(np_img, [3, 1, 1])
     np_img = np.transpose(np_img, [1, 2, 0])
     np_img = (np_img * 255.99).astype(np.uint8)
     img = pilImage.fromarray(np_img)
@@ -30,6 +581,232 @@ def rescale(np_img, scale_factor=0.5):
     img = skimage.transform.rescale(np_img, scale_factor, anti_aliasing=True)
     return img
 
+def rescale_gray_area(np_img, scale_factor=0.5): # returns (1, H, W) float32 gray img, box-averaged by largest integer factor of scale then bilinearly resampled, same output shape as rescale
+    out_shape = (max(1, int(round(np_img.shape[1] * scale_factor))), max(1, int(round(np_img.shape[2] * scale_factor))))
+    gray_img = np.mean(np_img, axis=0, dtype=np.float32)
+
+    # box averages blocks of factor x factor pixels, edge padded to whole blocks
+    factor = max(1, int(1.0 / scale_factor + 1e-6))
+    if factor > 1:
+        pad = (-gray_img.shape[0] % factor, -gray_img.shape[1] % factor)
+        if pad[0] > 0 or pad[1] > 0:
+            gray_img = np.pad(gray_img, ((0, pad[0]), (0, pad[1])), 'edge')
+        gray_img = gray_img.reshape(gray_img.shape[0] // factor, factor, gray_img.shape[1] // factor, factor).mean(axis=(1, 3))
+
+    # output pixel centers in box-averaged coords
+    coords_x = (np.arange(out_shape[0]) + 0.5) * (np_img.shape[1] / out_shape[0]) / factor - 0.5
+    coords_y = (np.arange(out_shape[1]) + 0.5) * (np_img.shape[2] / out_shape[1]) / factor - 0.5
+    gray_img = interpolate_linear(gray_img, coords_x, axis=0)
+    gray_img = interpolate_linear(gray_img, coords_y, axis=1)
+
+    return np.expand_dims(gray_img, axis=0)
+
+def interpolate_linear(img, coords, axis=0): # samples 2D img at fractional coords along axis, clamped to edges
+    coords = np.clip(coords, 0, img.shape[axis]-1)
+    low = np.floor(coords).astype(np.intp)
+    high = np.minimum(low+1, img.shape[axis]-1)
+    weights = (coords - low).astype(img.dtype)
+    weights = weights.reshape((-1, 1) if axis == 0 else (1, -1))
+    return np.take(img, low, axis=axis) * (1.0 - weights) + np.take(img, high, axis=axis) * weights
+
+def simplify_polyline(points, tolerance=1.0): # Douglas-Peucker, returns (N, 2) array of kept points, all within tolerance of simplified polyline
+    points = np.asarray(points)
+    num_points = len(points)
+    if num_points < 3:
+        return points
+
+    float_points = points.astype(np.float64)
+    keep = np.zeros(num_points, dtype=bool)
+    keep[0] = True
+    keep[-1] = True
+
+    # splits each segment at its farthest point until all points are within tolerance, distances computed per segment in one pass
+    segments = [(0, num_points-1)]
+    while len(segments) > 0:
+        start, end = segments.pop()
+        if end - start < 2:
+            continue
+
+        segment = float_points[end] - float_points[start]
+        offsets = float_points[start+1:end] - float_points[start]
+        segment_length_sq = np.dot(segment, segment)
+        if segment_length_sq > 0.0: # distance to segment, closed contours start & end on the same point
+            offsets = offsets - np.outer(np.clip(np.dot(offsets, segment) / segment_length_sq, 0.0, 1.0), segment)
+        dists_sq = np.einsum('ij,ij->i', offsets, offsets)
+
+        farthest_idx = int(np.argmax(dists_sq))
+        if dists_sq[farthest_idx] > tolerance * tolerance:
+            split_idx = start+1+farthest_idx
+            keep[split_idx] = True
+            segments.append((start, split_idx))
+            segments.append((split_idx, end))
+
+    return points[keep]
+
+def get_pixels_bbox(pixels): # returns (x_min, x_max, y_min, y_max) of list of pixels, max bounds exclusive
+    pixels = np.array(pixels)
+    return (int(pixels[:, 0].min()), int(pixels[:, 0].max())+1, int(pixels[:, 1].min()), int(pixels[:, 1].max())+1)
+
+def get_polyline_length(points):
+    return float(np.sum(np.linalg.norm(np.diff(np.asarray(points, dtype=np.float64), axis=0), axis=1)))
+
+def bezier_points(bezier, u): # evaluates (4, 2) cubic bezier at each parameter in u
+    u = u[:, np.newaxis]
+    return ((1.0-u)**3 * bezier[0]) + (3.0 * (1.0-u)**2 * u * bezier[1]) + (3.0 * (1.0-u) * u**2 * bezier[2]) + (u**3 * bezier[3])
+
+def fit_cubic_bezier_segment(points, u, left_tangent, right_tangent): # least squares fit of control point distances along fixed end tangents
+    basis = np.stack(((1.0-u)**3, 3.0 * (1.0-u)**2 * u, 3.0 * (1.0-u) * u**2, u**3), axis=-1)
+    a_left = basis[:, 1:2] * left_tangent
+    a_right = basis[:, 2:3] * right_tangent
+    residual = points - (np.outer(basis[:, 0] + basis[:, 1], points[0]) + np.outer(basis[:, 2] + basis[:, 3], points[-1]))
+
+    c00 = np.sum(a_left * a_left)
+    c01 = np.sum(a_left * a_right)
+    c11 = np.sum(a_right * a_right)
+    x0 = np.sum(a_left * residual)
+    x1 = np.sum(a_right * residual)
+    det = (c00 * c11) - (c01 * c01)
+
+    # falls back to a third of chord length if fit is degenerate
+    segment_length = np.linalg.norm(points[-1] - points[0])
+    alpha_left = alpha_right = segment_length / 3.0
+    if abs(det) > 1e-12:
+        alpha_left = ((x0 * c11) - (x1 * c01)) / det
+        alpha_right = ((c00 * x1) - (c01 * x0)) / det
+        if alpha_left < 1e-6 * segment_length or alpha_right < 1e-6 * segment_length:
+            alpha_left = alpha_right = segment_length / 3.0
+
+    return np.stack((points[0], points[0] + (alpha_left * left_tangent), points[-1] + (alpha_right * right_tangent), points[-1]))
+
+def reparameterize_bezier(bezier, points, u): # one Newton-Raphson step moving each parameter towards its point's closest point on curve
+    d1 = 3.0 * (bezier[1:] - bezier[:-1])
+    d2 = 2.0 * (d1[1:] - d1[:-1])
+    u_col = u[:, np.newaxis]
+    diff = bezier_points(bezier, u) - points
+    first = ((1.0-u_col)**2 * d1[0]) + (2.0 * (1.0-u_col) * u_col * d1[1]) + (u_col**2 * d1[2])
+    second = ((1.0-u_col) * d2[0]) + (u_col * d2[1])
+    numerator = np.sum(diff * first, axis=1)
+    denominator = np.sum(first * first, axis=1) + np.sum(diff * second, axis=1)
+    step = np.divide(numerator, denominator, out=np.zeros_like(numerator), where=np.abs(denominator) > 1e-12)
+    return np.clip(u - step, 0.0, 1.0)
+
+def normalize_vector(vector):
+    length = np.linalg.norm(vector)
+    if length < 1e-12:
+        return vector
+    return vector / length
+
+def smooth_closed_polyline(points, window=5): # moving average around closed polyline (first point repeated at end), others returned as is
+    points = np.asarray(points, dtype=np.float64)
+    if window <= 1 or len(points) <= 2*window or not np.array_equal(points[0], points[-1]):
+        return points
+
+    ring = points[:-1]
+    half_window = window // 2
+    wrapped = np.concatenate((ring[-half_window:], ring, ring[:half_window]))
+    cumsum = np.concatenate((np.zeros((1, 2)), np.cumsum(wrapped, axis=0)))
+    smoothed = (cumsum[window:] - cumsum[:-window]) / window
+    return np.concatenate((smoothed, smoothed[:1]))
+
+def thin_polyline(points, min_dist): # keeps points farther than min_dist from last kept one (& last point), as tracing with that min_dist_threshold would
+    points = np.asarray(points)
+    if len(points) <= 2 or min_dist <= 0:
+        return points
+
+    kept_idcs = [0]
+    last_x, last_y = points[0].tolist()
+    min_dist_sq = min_dist * min_dist
+    for i, (x, y) in enumerate(points[1:-1].tolist()):
+        if (x-last_x)**2 + (y-last_y)**2 > min_dist_sq:
+            kept_idcs.append(i+1)
+            last_x, last_y = x, y
+    kept_idcs.append(len(points)-1)
+    return points[kept_idcs]
+
+def fit_cubic_beziers(points, tolerance=1.0, max_iterations=4): # Schneider's algorithm, returns (N, 4, 2) array of beziers within tolerance of points
+    points = np.asarray(points, dtype=np.float64)
+
+    # removes repeated points, which have no direction
+    if len(points) > 1:
+        points = points[np.concatenate(([True], np.any(np.diff(points, axis=0) != 0.0, axis=1)))]
+    if len(points) < 2:
+        return np.zeros((0, 4, 2))
+
+    # closed contours get a shared tangent at their start & end point, so curve is smooth across it
+    if len(points) > 3 and np.array_equal(points[0], points[-1]):
+        left_tangent = normalize_vector(points[1] - points[-2])
+        right_tangent = -left_tangent
+    else:
+        left_tangent = normalize_vector(points[1] - points[0])
+        right_tangent = normalize_vector(points[-2] - points[-1])
+
+    beziers = []
+    segments = [(0, len(points)-1, left_tangent, right_tangent)]
+    while len(segments) > 0:
+        first, last, left_tangent, right_tangent = segments.pop()
+        segment_points = points[first:last+1]
+
+        if len(segment_points) == 2:
+            dist = np.linalg.norm(segment_points[1] - segment_points[0]) / 3.0
+            beziers.append(np.stack((segment_points[0], segment_points[0] + (dist * left_tangent), segment_points[1] + (dist * right_tangent), segment_points[1])))
+            continue
+
+        # chord length parameterization, refined by Newton-Raphson while error is close to tolerance
+        chord_lengths = np.concatenate(([0.0], np.cumsum(np.linalg.norm(np.diff(segment_points, axis=0), axis=1))))
+        u = chord_lengths / chord_lengths[-1]
+        for i in range(max_iterations+1):
+            bezier = fit_cubic_bezier_segment(segment_points, u, left_tangent, right_tangent)
+            errors = np.sum((bezier_points(bezier, u) - segment_points)**2, axis=1)
+            split_idx = int(np.argmax(errors[1:-1])) + 1
+            if errors[split_idx] <= tolerance * tolerance or errors[split_idx] > 16.0 * tolerance * tolerance:
+                break
+            u = reparameterize_bezier(bezier, segment_points, u)
+
+        if errors[split_idx] <= tolerance * tolerance:
+            beziers.append(bezier)
+            continue
+
+        # splits at point of max error, pushed in reverse so beziers come out in contour order
+        center_tangent = normalize_vector(segment_points[split_idx-1] - segment_points[split_idx+1])
+        segments.append((first+split_idx, last, -center_tangent, right_tangent))
+        segments.append((first, first+split_idx, left_tangent, center_tangent))
+
+    return np.stack(beziers)
+
+def format_scaled_coord(value, precision): # int value in units of 10^-precision pixels, with no trailing zeros or leading 0 before point
+    if precision == 0 or value % 10**precision == 0:
+        return str(value // 10**precision)
+    coord = ("%.*f" % (precision, value / 10**precision)).rstrip("0")
+    if coord.startswith("0."):
+        return coord[1:]
+    if coord.startswith("-0."):
+        return "-"+coord[2:]
+    return coord
+
+def format_polyline_path(points): # svg path data for closed polyline of (N, 2) int array in (x, y) = (row, col) coords
+    # formats all coords in one pass, rather than a string per point
+    return (("M%d %d " + ("L%d %d " * (len(points)-1)) + "Z") % tuple(points[:, ::-1].ravel().tolist()))
+
+def format_bezier_path(beziers, precision=1): # svg path data for (N, 4, 2) beziers in (x, y) = (row, col) coords, rounded to precision decimals
+    # rounds absolute coords before differencing, so relative coords never accumulate rounding error
+    coords = np.round(np.asarray(beziers)[:, :, ::-1] * 10**precision).astype(np.int64)
+    starts = np.concatenate((coords[:1, 0], coords[:-1, 3]))
+    offsets = (coords[:, 1:] - starts[:, np.newaxis]).ravel().tolist()
+
+    # one relative c command covers every curve, numbers need no separator before a minus sign
+    path = ["M"+format_scaled_coord(int(coords[0, 0, 0]), precision)+" "+format_scaled_coord(int(coords[0, 0, 1]), precision)+"c"]
+    for i in range(len(offsets)):
+        coord = format_scaled_coord(offsets[i], precision)
+        path.append(coord if i == 0 or coord.startswith("-") else " "+coord)
+    path.append("Z")
+    return "".join(path)
+
+def format_stats(stats):
+    stats_str = str(stats["paths"])+" paths, "+str(stats["commands"])+" path commands, "+str(stats["bytes"])+" bytes"
+    if stats["points_traced"] != stats["points"]:
+        stats_str += " (from "+str(stats["points_traced"])+" traced points, "+("%.0f%%" % (100.0 * stats["commands"] / max(stats["polyline_commands"], 1)))+" of path commands & "+("%.0f%%" % (100.0 * stats["path_bytes"] / max(stats["polyline_path_bytes"], 1)))+" of path bytes of polyline output)"
+    return stats_str
+
 id_counter = 0
 def unique_identifier():
     global id_counter
@@ -1,6 +1,6 @@
 from kivy.graphics import Color, Line, Rectangle, RoundedRectangle, Ellipse, PushMatrix, PopMatrix, Rotate
 from kivy.core.image import Image
-from kivy.core.window import Window
+from kivy.clock import Clock
 from kivy.uix.label import Label
 from kivy.graphics.instructions import InstructionGroup
 
@@ -10,6 +10,58 @@ import random
 import numpy as np
 
 global_snap_coefficient = 22.0
+animation_epsilon = 1e-3 # eased values within this of their targets snap to them, ending animation
+
+
+
+class AnimationScheduler(object):
+    # ticks registered updates every frame only while some easing is unfinished, sleeping until an animated value changes
+    def __init__(self):
+        self.callbacks = []
+        self.event = None
+        self.woken = False
+
+    def register(self, callback): # callback(dt) returns True while still animating
+        self.callbacks.append(callback)
+        self.wake()
+
+    def wake(self):
+        self.woken = True
+        if self.event is None:
+            self.event = Clock.schedule_interval(self.tick, 0)
+
+    def tick(self, dt):
+        self.woken = False
+        animating = False
+        for callback in self.callbacks:
+            animating = callback(dt) or animating
+
+        # values changed during tick keep it running for another frame
+        if not animating and not self.woken:
+            self.event = None
+            return False # unschedules tick
+
+animation_scheduler = AnimationScheduler()
+
+def animated_property(name): # attribute that wakes animation scheduler whenever it changes
+    attr_name = "_"+name
+
+    def get_value(self):
+        return getattr(self, attr_name)
+
+    def set_value(self, value):
+        if not hasattr(self, attr_name) or getattr(self, attr_name) != value:
+            setattr(self, attr_name, value)
+            animation_scheduler.wake()
+
+    return property(get_value, set_value)
+
+def ease_towards(values, target_values, amount): # returns values moved amount of the way to targets, snapped to targets once all are within animation_epsilon
+    amount = min(amount, 1.0)
+    eased_values = tuple([value + (amount * (target_value - value)) for value, target_value in zip(values, target_values)])
+    if all([abs(target_value - value) < animation_epsilon for value, target_value in zip(eased_values, target_values)]):
+        return tuple(target_values)
+    return eased_values
 
 
 
@@ -30,7 +82,7 @@ class ImageButton(InstructionGroup):
         self.add(self.bg_rect)
 
     def on_update(self, dt):
-        self.bg_rect.on_update(dt)
+        return self.bg_rect.on_update(dt)
 
     def set_pos(self, new_target_pos):
         self.pos = new_target_pos
@@ -67,6 +119,8 @@ class ImageButton(InstructionGroup):
                 self.callback()
 
 class Button(InstructionGroup):
+    state = animated_property("state")
+
     def __init__(self, pos, text="Button", stateful=False, draggable=False, initial_state=0, width=300.0, callback=None):
         super(Button, self).__init__()
 
@@ -94,8 +148,9 @@ class Button(InstructionGroup):
         elif self.state == 2:
             self.bg_rect.target_color_components = [0.3, 0.3, 0.8]
 
-        self.bg_rect.on_update(dt)
-        self.label.on_update(dt)
+        bg_rect_animating = self.bg_rect.on_update(dt)
+        label_animating = self.label.on_update(dt)
+        return bg_rect_animating or label_animating
 
     def on_click_down(self, touch_pos):
         if touch_pos[0] > self.pos[0]-(self.size[0]/2.0) and touch_pos[0] < self.pos[0]+(self.size[0]/2.0) and touch_pos[1] > self.pos[1]-(self.size[1]/2.0) and touch_pos[1] < self.pos[1]+(self.size[1]/2.0):
@@ -138,6 +193,10 @@ class Button(InstructionGroup):
                 self.callback()
 
 class CRect(InstructionGroup):
+    target_pos = animated_property("target_pos")
+    target_size = animated_property("target_size")
+    angle = animated_property("angle")
+
     def __init__(self, pos, size, color = (1.0, 1.0, 1.0), texture_path = "", snap_coefficient = global_snap_coefficient):
         super(CRect, self).__init__()
 
@@ -167,17 +226,19 @@ class CRect(InstructionGroup):
         self.rotate_instruction.angle = self.angle
 
         shape_needs_update = False
-        if self.target_pos != self.pos:
-            self.pos = (self.pos[0] + (self.snap_coefficient * dt * (self.target_pos[0] - self.pos[0])), self.pos[1] + (self.snap_coefficient * dt * (self.target_pos[1] - self.pos[1])))
+        if tuple(self.target_pos) != tuple(self.pos):
+            self.pos = ease_towards(self.pos, self.target_pos, self.snap_coefficient * dt)
             shape_needs_update = True
-        if self.target_size != self.size:
-            self.size = (self.size[0] + (self.snap_coefficient * dt * (self.target_size[0] - self.size[0])), self.size[1] + (self.snap_coefficient * dt * (self.target_size[1] - self.size[1])))
+        if tuple(self.target_size) != tuple(self.size):
+            self.size = ease_towards(self.size, self.target_size, self.snap_coefficient * dt)
             shape_needs_update = True
 
         if shape_needs_update:
             self.shape.pos = (self.pos[0]-(self.size[0]*0.5), self.pos[1]-(self.size[1]*0.5))
             self.shape.size = self.size
 
+        return tuple(self.pos) != tuple(self.target_pos) or tuple(self.size) != tuple(self.target_size)
+
     def change_texture(self, new_texture_path):
         if isinstance(self.shape, Rectangle):
             if new_texture_path != self.texture_path:
@@ -191,6 +252,9 @@ class CRect(InstructionGroup):
         self.shape.pos = (self.pos[0]-(self.size[0]*0.5), self.pos[1]-(self.size[1]*0.5))
 
 class CCircle(InstructionGroup):
+    target_pos = animated_property("target_pos")
+    target_size = animated_property("target_size")
+
     def __init__(self, pos, size, color = (1.0, 1.0, 1.0), snap_coefficient = global_snap_coefficient):
         super(CCircle, self).__init__()
 
@@ -208,23 +272,30 @@ class CCircle(InstructionGroup):
 
     def on_update(self, dt):
         shape_needs_update = False
-        if self.target_pos != self.pos:
-            self.pos = (self.pos[0] + (self.snap_coefficient * dt * (self.target_pos[0] - self.pos[0])), self.pos[1] + (self.snap_coefficient * dt * (self.target_pos[1] - self.pos[1])))
+        if tuple(self.target_pos) != tuple(self.pos):
+            self.pos = ease_towards(self.pos, self.target_pos, self.snap_coefficient * dt)
             shape_needs_update = True
-        if self.target_size != self.size:
-            self.size = (self.size[0] + (self.snap_coefficient * dt * (self.target_size[0] - self.size[0])), self.size[1] + (self.snap_coefficient * dt * (self.target_size[1] - self.size[1])))
+        if tuple(self.target_size) != tuple(self.size):
+            self.size = ease_towards(self.size, self.target_size, self.snap_coefficient * dt)
             shape_needs_update = True
 
         if shape_needs_update:
             self.shape.pos = (self.pos[0]-(self.size[0]*0.5), self.pos[1]-(self.size[1]*0.5))
             self.shape.size = self.size
 
+        return tuple(self.pos) != tuple(self.target_pos) or tuple(self.size) != tuple(self.target_size)
+
     def set_pos(self, new_pos):
         self.pos = new_pos
         self.target_pos = new_pos
         self.shape.pos = (self.pos[0]-(self.size[0]*0.5), self.pos[1]-(self.size[1]*0.5))
 
 class CRoundedRect(InstructionGroup):
+    target_pos = animated_property("target_pos")
+    target_size = animated_property("target_size")
+    target_color_components = animated_property("target_color_components")
+    force_update = animated_property("force_update")
+
     def __init__(self, pos, size, corner_radius = 20.0, color = (1.0, 1.0, 1.0), snap_coefficient = global_snap_coefficient):
         super(CRoundedRect, self).__init__()
 
@@ -246,11 +317,11 @@ class CRoundedRect(InstructionGroup):
 
     def on_update(self, dt, force_update=False):
         shape_needs_update = False
-        if self.target_pos != self.pos:
-            self.pos = (self.pos[0] + (self.snap_coefficient * dt * (self.target_pos[0] - self.pos[0])), self.pos[1] + (self.snap_coefficient * dt * (self.target_pos[1] - self.pos[1])))
+        if tuple(self.target_pos) != tuple(self.pos):
+            self.pos = ease_towards(self.pos, self.target_pos, self.snap_coefficient * dt)
             shape_needs_update = True
-        if self.target_size != self.size:
-            self.size = (self.size[0] + (self.snap_coefficient * dt * (self.target_size[0] - self.size[0])), self.size[1] + (self.snap_coefficient * dt * (self.target_size[1] - self.size[1])))
+        if tuple(self.target_size) != tuple(self.size):
+            self.size = ease_towards(self.size, self.target_size, self.snap_coefficient * dt)
             shape_needs_update = True
 
         if shape_needs_update or force_update or self.force_update:
@@ -261,13 +332,13 @@ class CRoundedRect(InstructionGroup):
 
         # color separately
         if self.target_color_components != self.color_components:
-            self.color_components[0] = self.color_components[0] + (self.snap_coefficient * dt * (self.target_color_components[0] - self.color_components[0]))
-            self.color_components[1] = self.color_components[1] + (self.snap_coefficient * dt * (self.target_color_components[1] - self.color_components[1]))
-            self.color_components[2] = self.color_components[2] + (self.snap_coefficient * dt * (self.target_color_components[2] - self.color_components[2]))
+            self.color_components = list(ease_towards(self.color_components, self.target_color_components, self.snap_coefficient * dt))
             self.color.r = self.color_components[0]
             self.color.g = self.color_components[1]
             self.color.b = self.color_components[2]
 
+        return tuple(self.pos) != tuple(self.target_pos) or tuple(self.size) != tuple(self.target_size) or self.color_components != self.target_color_components
+
     def set_color(self, new_color, dont_set_target=False):
         self.color_components = list(new_color)
         if not dont_set_target:
@@ -327,9 +398,13 @@ class CLine(InstructionGroup):
         # elif self.line_type == "bezier" or self.line_type == "curved":
         #     self.line.bezier = self.interlace_points()
 
-        pass
+        return False
 
 class LabelRect(InstructionGroup):
+    target_pos = animated_property("target_pos")
+    target_size = animated_property("target_size")
+    target_color_components = animated_property("target_color_components")
+
     def __init__(self, text, pos, size=(1.0, 1.0), font_size = 21, color = (1, 1, 1), snap_coefficient = global_snap_coefficient):
         super(LabelRect, self).__init__()
 
@@ -353,11 +428,11 @@ class LabelRect(InstructionGroup):
 
     def on_update(self, dt):
         shape_needs_update = False
-        if self.target_pos != self.pos:
-            self.pos = (self.pos[0] + (self.snap_coefficient * dt * (self.target_pos[0] - self.pos[0])), self.pos[1] + (self.snap_coefficient * dt * (self.target_pos[1] - self.pos[1])))
+        if tuple(self.target_pos) != tuple(self.pos):
+            self.pos = ease_towards(self.pos, self.target_pos, self.snap_coefficient * dt)
             shape_needs_update = True
-        if self.target_size != self.size:
-            self.size = (self.size[0] + (self.snap_coefficient * dt * (self.target_size[0] - self.size[0])), self.size[1] + (self.snap_coefficient * dt * (self.target_size[1] - self.size[1])))
+        if tuple(self.target_size) != tuple(self.size):
+            self.size = ease_towards(self.size, self.target_size, self.snap_coefficient * dt)
             shape_needs_update = True
 
         if shape_needs_update:
@@ -366,13 +441,13 @@ class LabelRect(InstructionGroup):
 
         # color separately
         if self.target_color_components != self.color_components:
-            self.color_components[0] = self.color_components[0] + (self.snap_coefficient * dt * (self.target_color_components[0] - self.color_components[0]))
-            self.color_components[1] = self.color_components[1] + (self.snap_coefficient * dt * (self.target_color_components[1] - self.color_components[1]))
-            self.color_components[2] = self.color_components[2] + (self.snap_coefficient * dt * (self.target_color_components[2] - self.color_components[2]))
+            self.color_components = list(ease_towards(self.color_components, self.target_color_components, self.snap_coefficient * dt))
             self.color.r = self.color_components[0]
             self.color.g = self.color_components[1]
             self.color.b = self.color_components[2]
 
+        return tuple(self.pos) != tuple(self.target_pos) or tuple(self.size) != tuple(self.target_size) or self.color_components != self.target_color_components
+
     def set_color(self, new_color, dont_set_target=False):
         self.color_components = list(new_color)
         if not dont_set_target: